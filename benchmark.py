@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+سنجش کارایی موتور سفارش‌گذاری روی فایل‌های مصنوعی.
+
+یک فایل اکسل مصنوعی (شیت سفارش و شیت DB با همان ساختار آدرس‌دهی فایل واقعی) ساخته می‌شود و زمان هر مرحله
+جداگانه اندازه گرفته می‌شود: خواندن فایل، خواندن تنظیمات DB، استخراج داده محصولات، محاسبه سفارش،
+گرد کردن (باکس/ردیف/پالت) و نوشتن خروجی. نتایج در یک فایل JSON ذخیره می‌شوند تا نسخه‌ها با هم مقایسه شوند.
+
+    python benchmark.py --skus 1000 20000 --platforms 3 --gaps 1 2 1 --output bench.json
+    python benchmark.py --skus 1000 20000 --compare bench.json
+    python benchmark.py --skus 5000 --check   (مقایسه با موتور مرجع روی همان داده)
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform as platform_info
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from inv_control.common import instruments, pd
+from inv_control.engine import FOS_TREND, SALES_TREND_DAYS, SeriesPrefixSums
+from inv_control.engine_check import MISMATCHES_SHOWN, compare_engines, format_mismatch
+from inv_control.loader import column_index, load_sku_table, read_db_settings, read_workbook_sheets, sheet_read_plan
+from inv_control.planning import load_plan_inputs, plan_orders
+from inv_control.settings import ENGINES, platform_schedule
+from inv_control.writers import write_suggested_orders
+
+STAGES = ('load', 'config', 'extract', 'calculate', 'rounding', 'write')
+
+# ساختار شیت سفارش: کد محصول در ستون A، فیلدها در B تا I، روند فروش از ستون J و بار در راه دو ردیف پایین‌تر
+FIRST_SKU_ROW = 8
+FIELD_COLUMNS = {
+    'Av_sales': 'B', 'inv': 'C', 'box': 'D', 'row': 'E', 'pallet': 'F',
+    'shelf_life': 'G', 'FOS': 'H', 'safty_stock': 'I',
+}
+SERIES_COLUMN = 'J'
+SHELF_LIFE_TABLE = ((10, 1), (30, 2), (60, 3), (90, 4), (180, 5), (365, 6))
+
+
+def synthetic_refs(num_of_days=SALES_TREND_DAYS):
+    """آدرس شروع ستون‌های محصول (همان کلیدهای شیت DB)."""
+    refs = {'sap_code': f'A{FIRST_SKU_ROW}'}
+    refs.update({name: f'{col}{FIRST_SKU_ROW}' for name, col in FIELD_COLUMNS.items()})
+    refs['sales_trend'] = f'{SERIES_COLUMN}{FIRST_SKU_ROW}'
+    refs['open_order'] = f'{SERIES_COLUMN}{FIRST_SKU_ROW + 2}'
+    return refs
+
+
+def synthetic_sku_data(num_skus, num_of_days=SALES_TREND_DAYS, seed=0):
+    """
+    داده تصادفی ولی واقع‌گرایانه محصولات: فروش روزانه حول میانگین، بار در راه گاه‌به‌گاه به اندازه باکس،
+    روند فروش ناقص برای بخشی از محصولات و چند سلول متنی (مثل '-') مانند فایل‌های واقعی.
+    """
+    rng = np.random.default_rng(seed)
+    avg_sales = np.round(rng.lognormal(mean=2.0, sigma=1.1, size=num_skus), 2)
+    avg_sales[rng.random(num_skus) < 0.05] = 0
+    box = rng.choice([1, 6, 12, 24, 48], size=num_skus)
+    pallet = box * rng.choice([10, 20, 40], size=num_skus)
+    row = np.where(rng.random(num_skus) < 0.3, 0, pallet // rng.choice([4, 5], size=num_skus))
+    sales = rng.poisson(np.repeat(avg_sales[:, None], num_of_days, axis=1)).astype(float)
+    history = np.where(rng.random(num_skus) < 0.15, rng.integers(0, num_of_days, size=num_skus), num_of_days)
+    incoming = np.where(rng.random((num_skus, num_of_days)) < 0.1,
+                        box[:, None] * rng.integers(1, 10, size=(num_skus, num_of_days)), 0)
+    return {
+        'sap_code': 1000000 + np.arange(num_skus),
+        'Av_sales': avg_sales,
+        'inv': rng.integers(0, 400, size=num_skus),
+        'box': box,
+        'row': row,
+        'pallet': pallet,
+        'shelf_life': rng.choice([10, 30, 45, 75, 90, 120, 365, 500], size=num_skus),
+        'FOS': np.where(rng.random(num_skus) < 0.8, FOS_TREND, "ثابت"),
+        'safty_stock': np.where(rng.random(num_skus) < 0.8, 0, rng.integers(1, 4, size=num_skus)),
+        'sales': sales,
+        'history': history,
+        'incoming': incoming,
+    }
+
+
+def write_synthetic_workbook(path, num_skus, product_gap=9, num_of_days=SALES_TREND_DAYS,
+                             lead_time=1, seed=0, sheet_name='1000', sheet_name_data_base='DB'):
+    """ساخت فایل xlsx مصنوعی با شیت سفارش و شیت DB (نوشتن جریانی با openpyxl برای فایل‌های بزرگ)."""
+    from openpyxl import Workbook
+
+    if product_gap < 3:
+        raise ValueError("product_gap must be at least 3 (sales row and open-order row)")
+    data = synthetic_sku_data(num_skus, num_of_days, seed)
+    field_order = ['sap_code'] + list(FIELD_COLUMNS)
+    series_start = column_index(SERIES_COLUMN)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    header = ['کد کالا', 'میانگین فروش', 'موجودی', 'باکس', 'ردیف', 'پالت', 'Shelf Life', 'FOS', 'موجودی اطمینان']
+    for _ in range(FIRST_SKU_ROW - 2):
+        sheet.append([])
+    sheet.append(header + [f'روز {day + 1}' for day in range(num_of_days)])
+    blank_rows = [[] for _ in range(product_gap - 3)]
+    for i in range(num_skus):
+        sales = data['sales'][i].tolist()
+        if data['history'][i] < num_of_days:
+            sales[data['history'][i]:] = ['-'] + [None] * (num_of_days - data['history'][i] - 1)
+        sheet.append([data[name][i].item() for name in field_order] + sales)
+        sheet.append([])
+        sheet.append([None] * series_start + data['incoming'][i].tolist())
+        for blank in blank_rows:
+            sheet.append(blank)
+
+    db = workbook.create_sheet(sheet_name_data_base)
+    items = [('lead_time', lead_time), ('product_gap', product_gap)] + list(synthetic_refs(num_of_days).items())
+    shelf_rows = [('x', 'y')] + list(SHELF_LIFE_TABLE)
+    x_col = column_index('X')
+    for i in range(max(len(items), len(shelf_rows))):
+        cells = [None] * (x_col + 4)
+        if i < len(shelf_rows):
+            cells[x_col], cells[x_col + 1] = shelf_rows[i]
+        if i < len(items):
+            cells[x_col + 2], cells[x_col + 3] = items[i]
+        db.append(cells)
+    workbook.save(path)
+    return path
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run_stages(workbook_path, order_horizon, num_of_platforms, is_every_day_platform, platform_gaps,
+               num_of_days, engine, output_path, sheet_name='1000', sheet_name_data_base='DB'):
+    """یک بار اجرای همه مراحل؛ زمان هر مرحله (ثانیه) و تعداد سفارش‌ها را برمی‌گرداند."""
+    timings = {}
+    schedule = platform_schedule(order_horizon, num_of_platforms, is_every_day_platform, platform_gaps)
+
+    df_sheet_db, load_db = _timed(lambda: read_workbook_sheets(
+        workbook_path, [sheet_name_data_base], use_cache=False)[sheet_name_data_base])
+    db_settings, timings['config'] = _timed(lambda: read_db_settings(df_sheet_db, num_of_days))
+    read_plan = sheet_read_plan(db_settings['layout'])
+    df_sheet, load_sheet = _timed(lambda: read_workbook_sheets(
+        workbook_path, [sheet_name], use_cache=False, read_plans={sheet_name: read_plan})[sheet_name])
+    timings['load'] = load_db + load_sheet
+
+    sku_table, timings['extract'] = _timed(lambda: load_sku_table(
+        df_sheet, df_sheet_db, db_settings['layout']))
+
+    def calculate():
+        prefix_sums = SeriesPrefixSums(sku_table.daily_sales, sku_table.daily_incoming)
+        main_order, _ = plan_orders(sku_table, db_settings['lead_time'], schedule, is_every_day_platform,
+                                           engine, prefix_sums, verbose=False)
+        return main_order
+
+    instruments.reset()
+    main_order, calculate_seconds = _timed(calculate)
+    # گرد کردن همان است که موتور دسته‌ای روی سفارش هر پلتفرم انجام داده (مرحله rounding در instruments)؛
+    # از calculate کم می‌شود تا جمع مراحل همان زمان کل بماند. موتور scalar گرد کردن جدا ندارد و rounding آن صفر است.
+    timings['rounding'] = instruments.stages.get('rounding', (0.0, 0.0, 0))[0]
+    timings['calculate'] = calculate_seconds - timings['rounding']
+
+    _, timings['write'] = _timed(lambda: write_suggested_orders(main_order, output_path))
+    orders = sum(len(orders) for orders in main_order.values())
+    return timings, orders
+
+
+def check_engines(workbook_path, order_horizon, num_of_platforms, is_every_day_platform, platform_gaps,
+                  num_of_days, engine):
+    """مقایسه موتور engine با موتور مرجع روی فایل مصنوعی؛ تعداد اختلاف‌ها (اولین‌ها روی stderr چاپ می‌شوند)."""
+    schedule = platform_schedule(order_horizon, num_of_platforms, is_every_day_platform, platform_gaps)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        lead_time, sku_table, _, _ = load_plan_inputs(workbook_path, use_cache=False, num_of_days=num_of_days)
+    mismatches = compare_engines(sku_table, lead_time, schedule, is_every_day_platform, engine)
+    for mismatch in mismatches[:MISMATCHES_SHOWN]:
+        print(format_mismatch(mismatch), file=sys.stderr)
+    return len(mismatches)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sku_counts, product_gap=9, num_of_days=SALES_TREND_DAYS, order_horizon=2,
+                  num_of_platforms=3, is_every_day_platform="no", platform_gaps=(1, 2, 1), lead_time=1,
+                  engine="batch", repeat=3, seed=0, workdir=None, check=False):
+    """
+    اجرای سنجش برای هر تعداد محصول؛ برای هر مرحله کمترین و میانه زمان بین تکرارها گزارش می‌شود.
+    فایل‌های مصنوعی در workdir (پیش‌فرض: پوشه موقت) ساخته می‌شوند و دوباره استفاده می‌شوند.
+    check: نتیجه موتور engine روی همان داده مصنوعی با موتور مرجع مقایسه و تعداد اختلاف‌ها ثبت می‌شود.
+    """
+    if is_every_day_platform == "yes":
+        platform_gaps = ()
+    workdir = workdir or tempfile.mkdtemp(prefix='inv_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    results = {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform_info.machine(),
+            'parameters': {
+                'product_gap': product_gap, 'num_of_days': num_of_days, 'order_horizon': order_horizon,
+                'platforms': num_of_platforms, 'every_day': is_every_day_platform,
+                'gaps': list(platform_gaps), 'lead_time': lead_time, 'engine': engine,
+                'repeat': repeat, 'seed': seed,
+            },
+        },
+        'runs': [],
+    }
+    for num_skus in sku_counts:
+        workbook_path = os.path.join(
+            workdir, f"synthetic_{num_skus}_g{product_gap}_d{num_of_days}_l{lead_time}_s{seed}.xlsx")
+        generate_seconds = 0.0
+        if not os.path.exists(workbook_path):
+            _, generate_seconds = _timed(lambda: write_synthetic_workbook(
+                workbook_path, num_skus, product_gap, num_of_days, lead_time, seed))
+        samples = {stage: [] for stage in STAGES}
+        for _ in range(repeat):
+            timings, orders = run_stages(
+                workbook_path, order_horizon, num_of_platforms, is_every_day_platform, platform_gaps,
+                num_of_days, engine, os.path.join(workdir, f"orders_{num_skus}.xlsx"))
+            for stage in STAGES:
+                samples[stage].append(timings[stage])
+        results['runs'].append({
+            'skus': num_skus,
+            'orders': orders,
+            'generate_seconds': generate_seconds,
+            'stages': {stage: {'min': min(values), 'median': statistics.median(values), 'samples': values}
+                       for stage, values in samples.items()},
+        })
+        if check:
+            results['runs'][-1]['mismatches'] = check_engines(
+                workbook_path, order_horizon, num_of_platforms, is_every_day_platform, platform_gaps, num_of_days,
+                engine)
+    return results
+
+
+def compare_results(current, baseline):
+    """نسبت زمان هر مرحله (کمترین زمان فعلی / کمترین زمان مبنا) برای تعداد محصولات مشترک."""
+    baseline_runs = {run['skus']: run for run in baseline['runs']}
+    ratios = {}
+    for run in current['runs']:
+        previous = baseline_runs.get(run['skus'])
+        if previous is None:
+            continue
+        ratios[run['skus']] = {
+            stage: run['stages'][stage]['min'] / previous['stages'][stage]['min']
+            for stage in STAGES
+            if stage in previous['stages'] and previous['stages'][stage]['min'] > 0
+        }
+    return ratios
+
+
+def print_results(results, ratios=None):
+    print(f"{'skus':>8} " + " ".join(f"{stage:>10}" for stage in STAGES) + f" {'total':>10}")
+    for run in results['runs']:
+        mins = [run['stages'][stage]['min'] for stage in STAGES]
+        print(f"{run['skus']:>8} " + " ".join(f"{value:>10.4f}" for value in mins) + f" {sum(mins):>10.4f}")
+        if ratios and run['skus'] in ratios:
+            row = ratios[run['skus']]
+            print(f"{'x base':>8} " + " ".join(
+                f"{row[stage]:>10.2f}" if stage in row else f"{'-':>10}" for stage in STAGES))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the order engine on synthetic workbooks.")
+    parser.add_argument('--skus', type=int, nargs='+', default=[1000, 10000], help="SKU counts to benchmark")
+    parser.add_argument('--gap', type=int, default=9, help="product_gap: rows per SKU block (default: 9)")
+    parser.add_argument('--days', type=int, default=SALES_TREND_DAYS,
+                        help="days of sales trend and open orders per SKU")
+    parser.add_argument('--horizon', type=int, default=2, help="order horizon of the first platform in days")
+    parser.add_argument('--platforms', type=int, default=3, help="number of platforms")
+    parser.add_argument('--every-day', dest='every_day', choices=('yes', 'no'), default='no')
+    parser.add_argument('--gaps', type=int, nargs='*', default=[1, 2, 1], help="gap after each platform")
+    parser.add_argument('--lead-time', type=int, default=1)
+    parser.add_argument('--engine', choices=ENGINES, default='batch')
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per SKU count")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="where synthetic workbooks are written and reused (default: temp dir)")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="print per-stage ratios against an earlier results JSON")
+    parser.add_argument('--check', action='store_true',
+                        help="also compare the engine with the scalar reference engine on the same data")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    gaps = args.gaps if args.every_day == 'no' else []
+    if args.every_day == 'no' and len(gaps) != args.platforms:
+        print(f"--gaps needs {args.platforms} values (one per platform)", file=sys.stderr)
+        return 2
+    results = run_benchmark(
+        args.skus, product_gap=args.gap, num_of_days=args.days, order_horizon=args.horizon,
+        num_of_platforms=args.platforms, is_every_day_platform=args.every_day, platform_gaps=gaps,
+        lead_time=args.lead_time, engine=args.engine, repeat=args.repeat, seed=args.seed, workdir=args.workdir,
+        check=args.check)
+
+    ratios = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            ratios = compare_results(results, json.load(f))
+    print_results(results, ratios)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"results written to {args.output}")
+    if args.check:
+        for run in results['runs']:
+            print(f"{run['skus']} SKUs: {run['mismatches']} mismatch(es) against the scalar reference engine")
+        return 0 if not any(run['mismatches'] for run in results['runs']) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""
+منطق برنامه سفارش‌گذاری؛ My_App.py فقط ورودی تعاملی و خط فرمان است.
+لایه‌ها به ترتیب وابستگی: common، engine، loader، engine_check، writers، settings، planning و
+بالاتر از همه branches، scenarios، backtest و service.
+"""
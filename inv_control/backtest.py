@@ -0,0 +1,254 @@
+"""بک‌تست سیاست سفارش‌گذاری روی فروش واقعی گذشته."""
+from collections import namedtuple
+
+from .common import instruments, logger, np, pd
+from .engine import FOS_TREND, calculate_order_quantity_batch, _code_key, plan_safety_stock, sku_product_codes
+from .planning import load_plan_inputs
+
+
+# فایل (پارامترهای محصول، موجودی و بار در راه روز اول) یک بار خوانده می‌شود و فروش واقعی روزانه هر محصول
+# (و اختیاری موجودی روز اول و بار در راه تاریخ‌دار) از یک فایل CSV خوانده می‌شود. سپس روز به روز: در روزهای سفارش (هر روز، یا طبق فاصله پلتفرم‌ها) موتور
+# دسته‌ای برای همه محصولات با هم سفارش می‌دهد، سفارش بعد از lead_time روز به موجودی می‌رسد و فروش واقعی
+# از موجودی کم می‌شود (فروش بیشتر از موجودی از دست می‌رود).
+
+BACKTEST_FORECASTS = ('trailing', 'perfect')
+
+SalesHistory = namedtuple('SalesHistory', ['dates', 'sales', 'start_inventory', 'incoming', 'unmatched_codes',
+                                           'missing_days', 'later_inventory'])
+
+BacktestResult = namedtuple('BacktestResult', ['dates', 'order_days', 'ordered', 'orders', 'pallets', 'demand',
+                                               'lost_units', 'stockout_days', 'overstock_days', 'average_stock',
+                                               'end_stock'])
+
+
+def load_sales_history(path, sku_table):
+    """
+    خواندن فروش واقعی از CSV بلند با ستون‌های date، product_code و sales (و اختیاری inventory و incoming).
+    روزها تقویمی و پیوسته از اولین تا آخرین تاریخ فایل‌اند؛ روزی که هیچ ردیفی ندارد (مثلاً تعطیل) روز بدون فروش
+    است و تعدادش در missing_days می‌آید.
+    خروجی SalesHistory: تاریخ‌ها، ماتریس فروش (ردیف جدول محصولات × روز؛ روز بدون داده صفر)، موجودی روز اول
+    هر ردیف (اگر ستون inventory باشد، وگرنه None)، ماتریس بار در راه (incoming: بار سفارش‌های قبلی که در آن
+    تاریخ می‌رسد؛ اگر ستون نباشد None)، تعداد کدهایی که در جدول نیستند، تعداد روزهای بدون ردیف و تعداد
+    موجودی‌های ثبت‌شده بعد از روز اول (که استفاده نمی‌شوند: موجودی بک‌تست از سفارش‌های خود سیاست می‌آید).
+    ردیف‌های هم‌کد جدول همه فروش همان کد را می‌گیرند. تاریخ خالی یا نامعتبر ValueError می‌دهد.
+    """
+    history = pd.read_csv(path, dtype={'product_code': str})
+    missing = {'date', 'product_code', 'sales'} - set(history.columns)
+    if missing:
+        raise ValueError(f"sales history needs column(s): {', '.join(sorted(missing))}")
+    history_dates = pd.to_datetime(history['date'], errors='coerce')
+    bad_dates = np.flatnonzero(history_dates.isna().to_numpy())
+    if len(bad_dates):
+        # شماره خط فایل (سطر اول سرستون‌هاست)
+        lines = ', '.join(str(i + 2) for i in bad_dates[:5]) + (', ...' if len(bad_dates) > 5 else '')
+        raise ValueError(f"sales history has {len(bad_dates)} row(s) with a blank or invalid date (line {lines})")
+    # روز تقویمی از اولین تاریخ (نه شماره تاریخ‌های موجود) تا فاصله‌های تقویم فشرده نشوند
+    history_dates = history_dates.dt.normalize()
+    dates = pd.date_range(history_dates.min(), history_dates.max(), freq='D') if len(history) else []
+    day_ids = (history_dates - history_dates.min()).dt.days.to_numpy(dtype=np.int64)
+    missing_days = len(dates) - len(np.unique(day_ids))
+
+    # کدهای یکتای تاریخچه به ردیف‌های جدول (هر کد ممکن است چند ردیف داشته باشد)
+    rows_of_code = {}
+    for row, code in enumerate(sku_product_codes(sku_table).tolist()):
+        rows_of_code.setdefault(_code_key(code), []).append(row)
+    code_ids, history_codes = pd.factorize(history['product_code'])
+    pairs = [(i, row) for i, code in enumerate(history_codes) for row in rows_of_code.get(code.strip(), ())]
+    unmatched = sum(1 for code in history_codes if code.strip() not in rows_of_code)
+
+    # اندیس ورودی‌های تاریخچه به تفکیک کد، سپس تکرار برای هر ردیف همان کد
+    valid = np.flatnonzero(code_ids >= 0)
+    by_code = valid[np.argsort(code_ids[valid], kind='stable')]
+    counts = np.bincount(code_ids[valid], minlength=len(history_codes))
+    starts = np.cumsum(counts) - counts
+    pair_codes, pair_rows = (np.array(column, dtype=np.int64) for column in zip(*pairs)) if pairs else (
+        np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    lengths = counts[pair_codes]
+    within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    entries = by_code[np.repeat(starts[pair_codes], lengths) + within]
+    rows, days = np.repeat(pair_rows, lengths), day_ids[entries]
+
+    num_of_skus = len(sku_table.records)
+    sales = np.zeros((num_of_skus, len(dates)))
+    np.add.at(sales, (rows, days), history['sales'].fillna(0).to_numpy(dtype=float)[entries])
+    start_inventory, later_inventory = None, 0
+    if 'inventory' in history.columns:
+        start_inventory = sku_table.records['initial_stock'].astype(float)
+        inventory = history['inventory'].to_numpy(dtype=float)[entries]
+        recorded = ~np.isnan(inventory)
+        known = (days == 0) & recorded
+        start_inventory[rows[known]] = inventory[known]
+        later_inventory = int((recorded & (days > 0)).sum())
+    incoming = None
+    if 'incoming' in history.columns:
+        incoming = np.zeros((num_of_skus, len(dates)))
+        np.add.at(incoming, (rows, days), history['incoming'].fillna(0).to_numpy(dtype=float)[entries])
+    return SalesHistory([day.date() for day in dates], sales, start_inventory, incoming, unmatched, missing_days,
+                        later_inventory)
+
+
+def _order_day_gaps(is_every_day, platform_gaps):
+    """چرخه روزهای سفارش: لیست (فاصله از شروع چرخه، what_next_platform) و طول چرخه."""
+    if is_every_day == "yes" or not platform_gaps or sum(platform_gaps) == 0:
+        return [(0, 0)], 1
+    offsets = np.concatenate([[0], np.cumsum(platform_gaps)[:-1]])
+    return [(int(offset), int(gap)) for offset, gap in zip(offsets, platform_gaps)], int(sum(platform_gaps))
+
+
+def check_backtest_span(lead_time, order_horizon, num_of_days):
+    """هر روز سفارش تا lead_time + order_horizon روز از روند را می‌خواند؛ بیرون زدن از روند ValueError است."""
+    if lead_time + order_horizon >= num_of_days:
+        raise ValueError(f"lead_time + order_horizon = {lead_time + order_horizon} does not fit the "
+                         f"{num_of_days}-day sales trend (raise --days)")
+
+
+def backtest_policy(sku_table, lead_time, history, order_horizon, is_every_day="no", platform_gaps=(),
+                    forecast='trailing', overstock_days=30):
+    """
+    اجرای روز به روز سیاست سفارش (calculate_order_quantity_batch) روی فروش واقعی history برای همه محصولات با هم.
+    سفارش روزهای قبل از همان موقع در بار در راه است، پس هر روز سفارش مثل یک پلتفرم تنها (P1) محاسبه می‌شود.
+    forecast: trailing یعنی روند فروش هر روز میانگین num_of_days روز قبل (روزهای قبل از شروع تاریخچه با میانگین
+    فروش شیت)، perfect یعنی فروش واقعی روزهای بعد (سقف عملکرد سیاست با پیش‌بینی کامل).
+    روز overstock: موجودی پایان روز بیشتر از overstock_days روز فروش (میانگین روند همان روز).
+    lead_time + order_horizon باید داخل روند num_of_days روزه باشد، وگرنه ValueError.
+    """
+    records = sku_table.records
+    num_of_skus, num_of_days = sku_table.daily_sales.shape
+    check_backtest_span(lead_time, order_horizon, num_of_days)
+    actual = history.sales
+    horizon_days = actual.shape[1]
+    product_codes = sku_product_codes(sku_table)
+    avg_sheet = records['avg_daily_sales']
+    fos = np.where(records['is_trend'], FOS_TREND, None)
+    order_days, cycle = _order_day_gaps(is_every_day, platform_gaps)
+    what_next_by_offset = dict(order_days)
+
+    # بار در راه: بار در راه تاریخ‌دار تاریخچه (اگر نباشد بار در راه شیت) به اضافه سفارش‌های بک‌تست که بعد از
+    # lead_time می‌رسند
+    pipeline = np.zeros((num_of_skus, horizon_days + num_of_days + lead_time + 1))
+    if history.incoming is not None:
+        pipeline[:, :horizon_days] = history.incoming
+    else:
+        pipeline[:, :num_of_days] = np.nan_to_num(sku_table.daily_incoming)
+    # جمع تجمعی فروش واقعی برای میانگین متحرک
+    cumulative = np.zeros((num_of_skus, horizon_days + 1))
+    np.cumsum(actual, axis=1, out=cumulative[:, 1:])
+    # فروش واقعی با میانگین شیت برای روزهای بعد از پایان تاریخچه (حالت perfect)
+    future = np.concatenate([actual, np.repeat(avg_sheet[:, None], num_of_days, axis=1)], axis=1)
+
+    stock = (history.start_inventory if history.start_inventory is not None
+             else records['initial_stock']).astype(float)
+    ordered = np.zeros(num_of_skus)
+    orders = np.zeros(num_of_skus, dtype=np.int64)
+    lost_units = np.zeros(num_of_skus)
+    stockout_days = np.zeros(num_of_skus, dtype=np.int64)
+    overstock = np.zeros(num_of_skus, dtype=np.int64)
+    stock_total = np.zeros(num_of_skus)
+    placed_days = 0
+
+    for day in range(horizon_days):
+        window_start = max(day - num_of_days, 0)
+        trailing = (cumulative[:, day] - cumulative[:, window_start]
+                    + avg_sheet * max(num_of_days - day, 0)) / num_of_days
+
+        if day % cycle in what_next_by_offset:
+            if forecast == 'perfect':
+                daily_sales = future[:, day:day + num_of_days]
+            else:
+                daily_sales = np.repeat(trailing[:, None], num_of_days, axis=1)
+            with instruments.stage('calculate'):
+                quantity = calculate_order_quantity_batch(
+                    product_codes, stock, lead_time, order_horizon, trailing, daily_sales,
+                    pipeline[:, day:day + num_of_days], records['safety_stock'], records['box_size'],
+                    records['pallet_size'], records['row_size'], records['shelf_life'], fos,
+                    0, 1, {}, what_next_by_offset[day % cycle], is_every_day)
+            pipeline[:, day + lead_time] += quantity
+            ordered += quantity
+            orders += quantity > 0
+            placed_days += 1
+
+        # رسیدن بار و فروش واقعی روز
+        available = stock + pipeline[:, day]
+        served = np.minimum(available, actual[:, day])
+        lost = actual[:, day] - served
+        stock = available - served
+        lost_units += lost
+        stockout_days += lost > 0
+        overstock += (trailing > 0) & (stock > trailing * overstock_days)
+        stock_total += stock
+
+    return BacktestResult(
+        history.dates, placed_days, ordered, orders, ordered / records['pallet_size'], actual.sum(axis=1),
+        lost_units, stockout_days, overstock, stock_total / max(horizon_days, 1), stock)
+
+
+def backtest_summary(result, sku_table):
+    """جمع شاخص‌های بک‌تست برای محصولات روندی."""
+    trend = sku_table.records['is_trend']
+    demand = float(result.demand[trend].sum())
+    lost = float(result.lost_units[trend].sum())
+    return {
+        'first_day': str(result.dates[0]) if result.dates else None,
+        'last_day': str(result.dates[-1]) if result.dates else None,
+        'days': len(result.dates),
+        'order_days': result.order_days,
+        'skus': int(trend.sum()),
+        'units_ordered': int(result.ordered[trend].sum()),
+        'pallets': round(float(result.pallets[trend].sum()), 2),
+        'order_lines': int(result.orders[trend].sum()),
+        'demand': round(demand, 2),
+        'lost_units': round(lost, 2),
+        'fill_rate': round(1 - lost / demand, 4) if demand > 0 else None,
+        'stockout_sku_days': int(result.stockout_days[trend].sum()),
+        'overstock_sku_days': int(result.overstock_days[trend].sum()),
+        # موجودی کل محصولات در یک روز متوسط (جمع میانگین موجودی محصولات)
+        'average_total_stock': round(float(result.average_stock[trend].sum()), 2),
+    }
+
+
+def write_backtest_skus(result, sku_table, output_file_name):
+    """شاخص‌های بک‌تست هر محصول در CSV."""
+    pd.DataFrame({
+        'product_code': sku_product_codes(sku_table),
+        'trend': sku_table.records['is_trend'],
+        'units_ordered': result.ordered.astype(np.int64),
+        'order_lines': result.orders,
+        'pallets': result.pallets.round(2),
+        'demand': result.demand,
+        'lost_units': result.lost_units,
+        'stockout_days': result.stockout_days,
+        'overstock_days': result.overstock_days,
+        'average_stock': result.average_stock.round(2),
+        'end_stock': result.end_stock,
+    }).to_csv(output_file_name, index=False, encoding='utf-8')
+
+
+def run_backtest(settings, history_file_name, forecast='trailing', overstock_days=30, output_file_name=None):
+    """بک‌تست کامل: خواندن فایل و تاریخچه، اجرای روز به روز و چاپ خلاصه؛ خلاصه برگردانده می‌شود."""
+    instruments.reset()
+    lead_time, sku_table, _, _ = load_plan_inputs(
+        settings['file'], settings['sheet_name'], settings['db_sheet'], settings['cache'], settings['cache_dir'],
+        settings['days'], settings['cache_hash'])
+    sku_table = plan_safety_stock(sku_table, lead_time, settings['order_horizon'], settings['safety_stock'],
+                                  settings['service_level'], settings['mc_samples'], settings['seed'])
+    # قبل از خواندن تاریخچه (که برای فایل‌های بزرگ طول می‌کشد)
+    check_backtest_span(lead_time, settings['order_horizon'], sku_table.daily_sales.shape[1])
+    with instruments.stage('history'):
+        history = load_sales_history(history_file_name, sku_table)
+    if history.unmatched_codes:
+        logger.warning("%d product code(s) of the sales history are not in the workbook", history.unmatched_codes)
+    if history.missing_days:
+        logger.warning("%d day(s) of the sales history have no rows and count as days without sales",
+                       history.missing_days)
+    if history.later_inventory:
+        logger.warning("%d inventory value(s) after the first day are not used; the backtest stock follows "
+                       "the replayed orders", history.later_inventory)
+    result = backtest_policy(sku_table, lead_time, history, settings['order_horizon'], settings['every_day'],
+                             settings['gaps'], forecast, overstock_days)
+    summary = backtest_summary(result, sku_table)
+    for key, value in summary.items():
+        print(f"{key:<20}{value}")
+    if output_file_name:
+        write_backtest_skus(result, sku_table, output_file_name)
+        print(f"per-SKU results written to {output_file_name}")
+    return summary
@@ -0,0 +1,158 @@
+"""اجرای چند شعبه به صورت موازی."""
+import os
+import traceback
+import json
+import time
+import contextlib
+import logging
+
+from .common import LOG_FORMAT, instruments, logger
+from .settings import plan_arguments, _read_json, validate_plan_settings
+from .planning import run_plan
+
+
+# هر شعبه فایل 1.xlsb و تنظیمات پلتفرم خودش را دارد؛ شعبه‌ها در یک process pool اجرا می‌شوند
+# و خطای یک شعبه (حتی از کار افتادن کامل پروسه) جلوی بقیه را نمی‌گیرد.
+
+WORKBOOK_EXTENSIONS = ('.xlsb', '.xlsx', '.xlsm', '.xls')
+
+def load_branch_manifest(source):
+    """
+    خواندن فهرست شعبه‌ها. source می‌تواند:
+    - یک فایل JSON باشد: {"defaults": {...}, "branches": [{"name": ..., "file": ..., ...}, ...]}
+    - یک پوشه باشد که هر زیرپوشه آن یک شعبه است (یک فایل اکسل و در صورت نیاز settings.json)،
+      و defaults.json اختیاری در خود پوشه تنظیمات مشترک را مشخص می‌کند.
+    تنظیمات هر شعبه: order_horizon، platforms، every_day، gaps، sheet_name، db_sheet، output، engine.
+    """
+    source = os.path.abspath(source)
+    branches = []
+    if os.path.isdir(source):
+        base_dir = source
+        defaults_path = os.path.join(source, 'defaults.json')
+        defaults = _read_json(defaults_path) if os.path.exists(defaults_path) else {}
+        for entry in sorted(os.listdir(source)):
+            branch_dir = os.path.join(source, entry)
+            if not os.path.isdir(branch_dir):
+                continue
+            workbooks = sorted(name for name in os.listdir(branch_dir)
+                               if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith('~$'))
+            if not workbooks:
+                continue
+            settings_path = os.path.join(branch_dir, 'settings.json')
+            branch = _read_json(settings_path) if os.path.exists(settings_path) else {}
+            branch.setdefault('name', entry)
+            branch.setdefault('file', os.path.join(branch_dir, workbooks[0]))
+            branches.append(branch)
+    else:
+        base_dir = os.path.dirname(source)
+        manifest = _read_json(source)
+        defaults = manifest.get('defaults', {})
+        branches = [dict(branch) for branch in manifest.get('branches', [])]
+
+    resolved = []
+    names = set()
+    for branch in branches:
+        branch = {**defaults, **branch}
+        if 'file' not in branch:
+            raise ValueError(f"branch {branch.get('name')!r} has no workbook file")
+        branch['file'] = os.path.join(base_dir, branch['file'])
+        branch.setdefault('name', os.path.splitext(os.path.basename(branch['file']))[0])
+        if branch['name'] in names:
+            raise ValueError(f"duplicate branch name {branch['name']!r}")
+        names.add(branch['name'])
+        resolved.append(branch)
+    return resolved
+
+
+def _run_branch(branch):
+    """اجرای یک شعبه در پروسه کارگر؛ خطا به صورت نتیجه برگردانده می‌شود نه استثنا."""
+    started = time.perf_counter()
+    result = {'name': branch['name'], 'file': branch['file'], 'output': branch['output'],
+              'log': branch['log']}
+    try:
+        settings = validate_plan_settings(branch, extra_keys=('name', 'log'))
+        with open(branch['log'], 'w', encoding='utf-8') as log_file, contextlib.redirect_stdout(log_file):
+            # هشدارها و خطاهای لاگ هم در فایل لاگ همان شعبه نوشته می‌شوند
+            handler = logging.StreamHandler(log_file)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            logger.addHandler(handler)
+            try:
+                main_order = run_plan(**plan_arguments(settings))
+            finally:
+                logger.removeHandler(handler)
+        result['status'] = 'ok'
+        result['instrumentation'] = instruments.as_dict()
+        result['platforms'] = {
+            platform: {'skus': len(orders), 'units': int(orders.sum())}
+            for platform, (_, _, orders) in ((name, main_order.platform_columns(name)) for name in main_order)}
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    result['elapsed'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_branches(source, output_dir=None, max_workers=None):
+    """
+    اجرای همزمان همه شعبه‌های یک manifest یا پوشه در یک process pool به اندازه تعداد هسته‌ها.
+    خروجی و لاگ هر شعبه در output_dir نوشته می‌شود و خلاصه همه شعبه‌ها (موفق و ناموفق)
+    برگردانده و در branches_summary.json ذخیره می‌شود.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    branches = load_branch_manifest(source)
+    if output_dir is None:
+        output_dir = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    os.makedirs(output_dir, exist_ok=True)
+    for branch in branches:
+        branch.setdefault('output', f"{branch['name']}_suggested_orders.xlsx")
+        branch['output'] = os.path.join(output_dir, branch['output'])
+        branch['log'] = os.path.join(output_dir, f"{branch['name']}.log")
+
+    results = {}
+    pending = branches
+    isolated = False
+    while pending:
+        # اگر پروسه‌ای از کار بیفتد کل pool خراب می‌شود؛ شعبه‌های ناتمام یکی‌یکی و جدا دوباره اجرا می‌شوند
+        groups = [[branch] for branch in pending] if isolated else [pending]
+        crashed = []
+        for group in groups:
+            workers = max_workers or min(len(group), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_run_branch, branch): branch for branch in group}
+                for future in as_completed(futures):
+                    branch = futures[future]
+                    try:
+                        results[branch['name']] = future.result()
+                    except BrokenProcessPool:
+                        if isolated:
+                            results[branch['name']] = {
+                                'name': branch['name'], 'file': branch['file'], 'status': 'failed',
+                                'error': 'worker process crashed', 'log': branch['log']}
+                        else:
+                            crashed.append(branch)
+        pending = crashed
+        isolated = True
+
+    ordered = [results[branch['name']] for branch in branches]
+    summary = {
+        'succeeded': sum(1 for result in ordered if result['status'] == 'ok'),
+        'failed': sum(1 for result in ordered if result['status'] != 'ok'),
+        'branches': ordered,
+    }
+    with open(os.path.join(output_dir, 'branches_summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def print_branch_summary(summary):
+    """چاپ خلاصه اجرای شعبه‌ها."""
+    for result in summary['branches']:
+        if result['status'] == 'ok':
+            units = sum(platform['units'] for platform in result['platforms'].values())
+            print(f"[OK]     {result['name']}: {units} units in {result['elapsed']}s -> {result['output']}")
+        else:
+            print(f"[FAILED] {result['name']}: {result['error']} (log: {result['log']})")
+    print(f"{summary['succeeded']} branch(es) succeeded, {summary['failed']} failed.")
@@ -0,0 +1,85 @@
+"""زیرساخت مشترک ماژول‌ها: بارگذاری تنبل pandas و numpy، لاگ و اندازه‌گیری مراحل."""
+import sys
+import importlib.util
+import time
+import contextlib
+import logging
+
+
+def _lazy_import(name):
+    """
+    بارگذاری تنبل یک ماژول سنگین: import واقعی در اولین دسترسی به یکی از اعضای ماژول انجام می‌شود.
+    به این ترتیب --help و بررسی تنظیمات بدون بارگذاری pandas و numpy اجرا می‌شوند.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+pd = _lazy_import('pandas')
+np = _lazy_import('numpy')
+
+
+# --- اندازه‌گیری مراحل، شمارنده‌ها و لاگ ---
+# جزئیات هر محصول (که قبلاً برای هر محصول در هر پلتفرم چاپ می‌شد) فقط در سطح DEBUG لاگ می‌شود.
+
+logger = logging.getLogger('inv_control')
+LOG_FORMAT = '%(levelname)s: %(message)s'
+
+
+class Instrumentation:
+    """
+    زمان دیواری و زمان CPU هر مرحله (با چند بار اجرا جمع می‌شوند) و شمارنده‌های مسیرهای پرتکرار
+    (سلول‌های خوانده‌شده، جستجوها، استفاده دوباره از ایندکس جستجو، محصولات رد شده به خاطر FOS و ...).
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    def reset(self):
+        self.stages.clear()
+        self.counters.clear()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu, calls = self.stages.get(name, (0.0, 0.0, 0))
+            self.stages[name] = (wall + time.perf_counter() - wall_start,
+                                 cpu + time.process_time() - cpu_start, calls + 1)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def as_dict(self):
+        return {
+            'stages': {name: {'wall': wall, 'cpu': cpu, 'calls': calls}
+                       for name, (wall, cpu, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+
+    def summary_table(self):
+        lines = [f"{'stage':<16}{'wall (s)':>12}{'cpu (s)':>12}{'calls':>8}"]
+        for name, (wall, cpu, calls) in self.stages.items():
+            lines.append(f"{name:<16}{wall:>12.4f}{cpu:>12.4f}{calls:>8}")
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<28}{'value':>12}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<28}{value:>12}")
+        return "\n".join(lines)
+
+
+# نمونه مشترک ماژول؛ run_plan در ابتدای هر اجرا آن را صفر می‌کند
+instruments = Instrumentation()
@@ -0,0 +1,148 @@
+"""بررسی هم‌ارزی موتورها با موتور مرجع."""
+import csv
+import json
+import math
+from datetime import datetime
+from collections import namedtuple
+
+from .common import instruments, logger, np
+from .engine import (
+    _FINGERPRINT_FIELDS, SKU_CHUNK_SIZE, OrderTable, SeriesPrefixSums, calculate_platform_orders, _sku_pool,
+    sku_product_codes, sku_subset,
+)
+
+
+# --- بررسی هم‌ارزی موتورها با موتور مرجع ---
+# هر موتور سریع‌تر باید دقیقاً همان مقدار calculate_order_quantity مرجع را بدهد. compare_engines هر دو موتور را
+# روی ردیف‌های یکسان و با سفارش پلتفرم‌های قبلی یکسان اجرا می‌کند، پس هر اختلاف مال همان محصول و پلتفرم است
+# و به پلتفرم‌های بعد سرایت نمی‌کند. چون سفارش پلتفرم‌های قبلی با کد محصول خوانده می‌شود، نمونه‌ها همه ردیف‌های
+# یک کد را با هم دارند. حالت shadow در run_plan همین مقایسه را روی نمونه‌ای از محصولات و با همان سفارش‌هایی
+# که اجرای اصلی دیده انجام می‌دهد؛ هزینه‌اش با کسر نمونه و سقف تعداد کدها محدود می‌شود.
+
+EngineMismatch = namedtuple('EngineMismatch', ['platform', 'row', 'product_code', 'reference', 'candidate', 'inputs'])
+
+# حداکثر تعداد اختلاف‌هایی که حالت shadow یا فرمان check جزئیاتشان را چاپ می‌کند
+MISMATCHES_SHOWN = 20
+
+
+def sample_code_groups(sku_table, fraction=1.0, max_skus=None, seed=None):
+    """
+    ردیف‌های نمونه تصادفی از کدهای محصول (با همه ردیف‌های هر کد انتخاب‌شده) به ترتیب جدول.
+    fraction کسر کدها و max_skus سقف تعداد کدهای نمونه است؛ seed=None هر بار نمونه تازه می‌گیرد.
+    """
+    code_ids = sku_table.records['code_id']
+    unique_ids = np.unique(code_ids)
+    count = math.ceil(fraction * len(unique_ids))
+    if max_skus is not None:
+        count = min(count, max_skus)
+    if count >= len(unique_ids):
+        return np.arange(len(code_ids))
+    chosen = np.random.default_rng(seed).choice(unique_ids, size=count, replace=False)
+    return np.flatnonzero(np.isin(code_ids, chosen))
+
+
+def _engine_inputs(sku_table, i, order_horizon, what_next_platform, order_list, product_code):
+    """ورودی‌های محاسبه سفارش ردیف i (برای گزارش اختلاف)."""
+    record = sku_table.records[i]
+    inputs = {name: record[name].item() for name in _FINGERPRINT_FIELDS}
+    inputs['is_trend'] = bool(record['is_trend'])
+    inputs['order_horizon'] = order_horizon
+    inputs['what_next_platform'] = what_next_platform
+    inputs['previous_orders'] = {name: order_list.quantity(name, product_code) for name in order_list}
+    inputs['daily_sales'] = sku_table.daily_sales[i].tolist()
+    inputs['daily_incoming'] = sku_table.daily_incoming[i].tolist()
+    return inputs
+
+
+def compare_engines(sku_table, lead_time, schedule, is_every_day="no", candidate="batch", rows=None,
+                    candidate_quantities=None, workers=1, chunk_size=SKU_CHUNK_SIZE):
+    """
+    اجرای موتور مرجع (scalar) و موتور candidate روی ردیف‌های rows (پیش‌فرض: همه) برای همه پلتفرم‌های schedule.
+    سفارش پلتفرم‌های قبلی برای هر دو موتور یکی است: نتیجه موتور مرجع، یا اگر candidate_quantities
+    (ماتریس ردیف × پلتفرم کل جدول، مثلاً نتیجه اجرای اصلی) داده شود همان مقادیر و candidate دوباره اجرا نمی‌شود.
+    خروجی لیست EngineMismatch برای هر (پلتفرم، ردیف) با مقدار متفاوت؛ row شماره ردیف در sku_table است.
+    workers > 1: موتور مرجع (و candidate اگر scalar باشد) در تکه‌های chunk_size ردیفی چند پروسه‌ای اجرا می‌شود.
+    """
+    rows = np.arange(len(sku_table.records)) if rows is None else np.asarray(rows)
+    table = sku_subset(sku_table, rows)
+    code_ids = table.records['code_id']
+    product_codes = sku_product_codes(table)
+    prefix_sums = SeriesPrefixSums(table.daily_sales, table.daily_incoming)
+    order_list = OrderTable(table.codes, datetime.now().date())
+
+    mismatches = []
+    with _sku_pool(workers) as pool:
+        for platform_num, (order_horizon, what_next_platform) in enumerate(schedule):
+            arguments = {
+                'lead_time': lead_time,
+                'order_horizon': order_horizon,
+                'platform_num': platform_num,
+                'num_of_platforms': len(schedule),
+                'order_list': order_list,
+                'what_next_platform': what_next_platform,
+                'is_every_day': is_every_day,
+            }
+            reference = calculate_platform_orders(table, engine="scalar", pool=pool, chunk_size=chunk_size,
+                                                  **arguments)
+            if candidate_quantities is None:
+                observed = calculate_platform_orders(table, engine=candidate, prefix_sums=prefix_sums, pool=pool,
+                                                     chunk_size=chunk_size, **arguments)
+                placed = reference
+            else:
+                observed = np.asarray(candidate_quantities)[rows, platform_num]
+                placed = observed
+            for i in np.flatnonzero(reference != observed).tolist():
+                mismatches.append(EngineMismatch(
+                    platform_num + 1, int(rows[i]), product_codes[i], int(reference[i]), int(observed[i]),
+                    _engine_inputs(table, i, order_horizon, what_next_platform, order_list, product_codes[i])))
+            ordered = np.flatnonzero(placed > 0)
+            order_list.add_platform(f"P{platform_num + 1}", code_ids[ordered], placed[ordered], order_horizon - 1)
+    return mismatches
+
+
+def format_mismatch(mismatch):
+    """یک خط خوانا برای یک اختلاف؛ row اندیس ردیف جدول محصولات است (نه شماره ردیف شیت)."""
+    inputs = ", ".join(f"{key}={value}" for key, value in mismatch.inputs.items())
+    return (f"P{mismatch.platform} row {mismatch.row} code {mismatch.product_code}: "
+            f"reference {mismatch.reference} != engine {mismatch.candidate} ({inputs})")
+
+
+def write_engine_mismatches(mismatches, path):
+    """ذخیره اختلاف‌ها به صورت JSON (پسوند .json) یا CSV (ورودی‌های لیستی و دیکشنری به صورت JSON)."""
+    rows = [{'platform': m.platform, 'row': m.row, 'product_code': m.product_code, 'reference': m.reference,
+             'candidate': m.candidate, **m.inputs} for m in mismatches]
+    if path.lower().endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        return
+    columns = list(EngineMismatch._fields[:5]) + (list(rows[0])[5:] if rows else [])
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        out = csv.DictWriter(f, fieldnames=columns)
+        out.writeheader()
+        for row in rows:
+            out.writerow({key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                          for key, value in row.items()})
+
+
+def shadow_check(sku_table, lead_time, schedule, is_every_day, quantities, fraction, max_skus=None, seed=None):
+    """
+    حالت shadow: نمونه‌ای از محصولات با موتور مرجع دوباره محاسبه و با quantities اجرای اصلی مقایسه می‌شود.
+    اختلاف‌ها در لاگ (سطح ERROR) و شمارنده‌های shadow_* ثبت و برگردانده می‌شوند؛ خطای خود بررسی
+    اجرای اصلی را متوقف نمی‌کند (None برگردانده می‌شود).
+    """
+    with instruments.stage('shadow'):
+        try:
+            rows = sample_code_groups(sku_table, fraction, max_skus, seed)
+            mismatches = compare_engines(sku_table, lead_time, schedule, is_every_day, rows=rows,
+                                         candidate_quantities=quantities)
+        except Exception:
+            logger.exception("shadow check failed")
+            instruments.count('shadow_errors')
+            return None
+    instruments.count('shadow_skus', len(rows))
+    instruments.count('shadow_mismatches', len(mismatches))
+    for mismatch in mismatches[:MISMATCHES_SHOWN]:
+        logger.error("shadow mismatch: %s", format_mismatch(mismatch))
+    if len(mismatches) > MISMATCHES_SHOWN:
+        logger.error("... and %d more shadow mismatch(es)", len(mismatches) - MISMATCHES_SHOWN)
+    return mismatches
@@ -0,0 +1,830 @@
+"""خواندن فایل اکسل: آدرس‌های A1، جستجو در شیت، کش شیت‌ها و بارگذاری جدول محصولات."""
+import os
+import hashlib
+import json
+import re
+import functools
+import math
+import itertools
+import bisect
+import weakref
+import zipfile
+from datetime import datetime
+from collections import namedtuple
+
+from .common import instruments, logger, np, pd
+from .engine import (
+    FOS_TREND, SALES_TREND_DAYS, SKU_RECORD_FIELDS, SkuTable, _as_float_array, encode_product_codes,
+    _map_cells, _to_float,
+)
+
+
+# --- توابع کمکی اصلی (بدون تغییر در منطق) ---
+
+def Separate_string_from_num(my_string, gap):
+    """جدا کردن بخش حرفی و عددی از یک رشته آدرس اکسل و اضافه کردن یک مقدار (gap) به بخش عددی."""
+    number_part = ""
+    letter_part = ""
+
+    for char in my_string:
+        if char.isdigit():  # چک می‌کنه که آیا کاراکتر، عدد هست یا نه
+            number_part += char
+        else:
+            letter_part += char
+
+    if not number_part:
+        # اگر رشته عدد نداشت، فقط بخش حرفی را برمی‌گرداند (مثلاً اگر 'A' باشد)
+        return str(letter_part)
+
+    try:
+        real_number = int(number_part)
+        new_str = f"{letter_part}{real_number + gap}"
+        return str(new_str)
+    except ValueError:
+        return str(my_string) # در صورت خطا در تبدیل به عدد، رشته اصلی برگردانده می‌شود
+
+
+def split_letter(input_str):
+    """استخراج بخش حرفی از آدرس سلول."""
+    letter = ""
+    for char in input_str:
+        if char.isalpha():  # چک می‌کنه که کاراکتر حرفه
+            letter += char
+    return letter
+
+
+def split_number(input_str):
+    """استخراج بخش عددی از آدرس سلول و تبدیل به عدد صحیح."""
+    number = ""
+    for char in input_str:
+        if char.isdigit():  # چک می‌کنه که کاراکتر عدده
+            number += char
+    try:
+        return int(number)
+    except ValueError:
+        return 0
+
+
+# --- تبدیل آدرس A1 به اندیس (و برعکس) ---
+# حروف ستون در مبنای 26 بدون صفر خوانده می‌شوند (A=1 ... Z=26، AA=27 ... XFD=16384).
+# هر آدرس فقط یک بار تجزیه می‌شود و نتیجه کش می‌شود.
+
+EXCEL_MAX_COLUMNS = 16384
+EXCEL_MAX_ROWS = 1048576
+
+_A1_PATTERN = re.compile(r'\$?([A-Za-z]{1,3})\$?([0-9]+)')
+
+
+@functools.lru_cache(maxsize=None)
+def column_index(letters):
+    """اندیس صفرمبنای ستون از حروف آن ('A' -> 0، 'Z' -> 25، 'AA' -> 26)؛ برای حروف نامعتبر ValueError."""
+    if not isinstance(letters, str) or not letters.isascii() or not letters.isalpha():
+        raise ValueError(f"invalid column letters: {letters!r}")
+    position = 0
+    for char in letters.upper():
+        position = position * 26 + (ord(char) - ord('A') + 1)
+    if position > EXCEL_MAX_COLUMNS:
+        raise ValueError(f"column {letters!r} is beyond the last Excel column")
+    return position - 1
+
+
+@functools.lru_cache(maxsize=None)
+def column_letters(index):
+    """حروف ستون از اندیس صفرمبنا (0 -> 'A'، 26 -> 'AA')."""
+    if not 0 <= index < EXCEL_MAX_COLUMNS:
+        raise ValueError(f"column index out of range: {index}")
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_a1(excel_ref):
+    """
+    تبدیل آدرس A1 (مثل 'AB8' یا '$AB$8') به (ردیف، ستون) صفرمبنا.
+    آدرس باید دقیقاً حروف ستون و شماره ردیف باشد؛ در غیر این صورت ValueError.
+    """
+    match = _A1_PATTERN.fullmatch(excel_ref.strip()) if isinstance(excel_ref, str) else None
+    if match is None:
+        raise ValueError(f"invalid cell reference: {excel_ref!r}")
+    row = int(match.group(2))
+    if not 1 <= row <= EXCEL_MAX_ROWS:
+        raise ValueError(f"invalid cell reference: {excel_ref!r} (row out of range)")
+    return row - 1, column_index(match.group(1))
+
+
+def format_a1(row, col):
+    """آدرس A1 از (ردیف، ستون) صفرمبنا."""
+    return f"{column_letters(col)}{row + 1}"
+
+
+def find_alphabet_position(char):
+    """پیدا کردن شماره ستون اکسل (A=1, B=2, ..., Z=26, AA=27, ...)."""
+    # مثل قبل فقط حروف آدرس در نظر گرفته می‌شود و برای حروف نامعتبر 1 برگردانده می‌شود
+    try:
+        return column_index(split_letter(char).upper()) + 1
+    except ValueError:
+        return 1
+
+
+def safe_get_value(value):
+    """
+    این تابع مقدار را به صورت امن به عدد تبدیل می‌کند. اگر مقدار خالی یا غیرعددی باشد، 0 برمی‌گرداند.
+
+    :param value: مقدار خوانده شده از سلول اکسل (یا DataFrame)
+    :return: مقدار به صورت عدد صحیح یا 0
+    """
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return 1
+    
+    try:
+        # اگر مقدار رشته باشد، ابتدا سعی می‌کنیم آن را به float و سپس به int تبدیل کنیم.
+        # در غیر این صورت، مستقیماً به float تبدیل می‌کنیم.
+        if isinstance(value, str):
+             # حذف هر گونه کاما یا فضای خالی قبل از تبدیل
+            cleaned_value = value.replace(',', '').strip()
+            return float(cleaned_value)
+        return float(value)
+    except (ValueError, TypeError):
+        # اگر تبدیل موفق نبود (مثلا رشته واقعی بود)، 1 برگردانده شود (طبق منطق اصلی).
+        return 1
+
+
+# --- توابع مربوط به تعامل با داده (با تغییر به Pandas) ---
+
+def get_value_by_excel_ref(df, excel_ref):
+    """
+    مقدار یک سلول را با استفاده از آدرس دهی A1 اکسل (مثلاً 'A8') از DataFrame برمی‌گرداند.
+    :param df: DataFrame که داده‌ها از آن خوانده می‌شوند (فرض می‌شود بدون هدر خوانده شده است).
+    :param excel_ref: آدرس سلول اکسل (مثلاً 'A8').
+    :return: مقدار سلول.
+    """
+    if not isinstance(excel_ref, str):
+        return excel_ref
+
+    position = _ref_position(excel_ref)
+    if position is None:
+        return None # آدرس دهی معتبر نیست
+    # ردیف 1 اکسل ایندکس 0 pandas است (چون بدون هدر خواندیم)
+    row_index, col_index = position
+
+    try:
+        # استفاده از iloc برای دسترسی به موقعیت (row_index، col_index)
+        return df.iloc[row_index, col_index]
+    except IndexError:
+        logger.warning("!!!خطا در دسترسی به سلول %s. خارج از محدوده DataFrame!!!", excel_ref)
+        return None
+    except Exception as e:
+        logger.warning("خطای غیرمنتظره در دسترسی به سلول %s: %s", excel_ref, e)
+        return None
+
+class LookupIndex:
+    """
+    ایندکس جستجو برای یک جفت (ستون جستجو، ستون نتیجه) از یک شیت.
+    جستجوی دقیق با دیکشنری و جستجوی تقریبی (نزدیکترین مقدار عددی) با آرایه مرتب و bisect انجام می‌شود؛
+    نتیجه‌ها، حالت تساوی (اولین ردیف) و نادیده گرفتن سلول‌های غیرعددی مثل جستجوی خطی قبلی است.
+    """
+
+    def __init__(self, lookup_series, result_series):
+        self.lookup_series = lookup_series
+        self.result_series = result_series
+
+        # جستجوی دقیق: اولین ردیف هر مقدار (NaN با هیچ مقداری برابر نیست)
+        self.exact_positions = {}
+        self.unhashable_positions = []
+        for i, value in enumerate(lookup_series):
+            if value != value:
+                continue
+            try:
+                self.exact_positions.setdefault(value, i)
+            except TypeError:
+                self.unhashable_positions.append((i, value))
+
+        # جستجوی تقریبی: مقادیر عددی مرتب شده و اولین ردیف هر مقدار
+        first_position = {}
+        for i, value in enumerate(lookup_series):
+            if value is None:
+                continue
+            try:
+                numeric_value = float(value)
+            except (ValueError, TypeError):
+                continue
+            if math.isfinite(numeric_value):
+                first_position.setdefault(numeric_value, i)
+        self.sorted_keys = sorted(first_position)
+        self.sorted_positions = [first_position[key] for key in self.sorted_keys]
+
+    def exact(self, lookup_value):
+        """جستجوی دقیق (اولین ردیفی که مقدارش برابر lookup_value است)."""
+        try:
+            position = self.exact_positions.get(lookup_value)
+        except TypeError:
+            # مقدار جستجوی غیرقابل هش: مثل قبل به صورت خطی جستجو می‌شود
+            position = next((i for i, value in enumerate(self.lookup_series) if value == lookup_value), None)
+        for i, value in self.unhashable_positions:
+            if position is not None and i > position:
+                break
+            if value == lookup_value:
+                position = i
+                break
+        return None if position is None else self.result_series[position]
+
+    def nearest(self, lookup_value):
+        """نزدیکترین مقدار عددی به lookup_value (در تساوی فاصله، ردیف بالاتر)."""
+        keys = self.sorted_keys
+        # مثل جستجوی خطی قبلی مقدار جستجو خودش به عدد تبدیل نمی‌شود: متن (حتی '12') با هیچ ردیفی جور نیست
+        if not keys or isinstance(lookup_value, (str, bytes)):
+            return None
+        try:
+            target = float(lookup_value)
+        except (ValueError, TypeError):
+            return None
+        if not math.isfinite(target):
+            return None
+
+        right = bisect.bisect_left(keys, target)
+        left = right - 1
+        best_difference = min(abs(keys[i] - target) for i in (left, right) if 0 <= i < len(keys))
+        # کلیدهایی که به خاطر گرد شدن ممیز شناور فاصله برابر دارند هم بررسی می‌شوند
+        best_position = None
+        while left >= 0 and abs(keys[left] - target) == best_difference:
+            best_position = self.sorted_positions[left] if best_position is None else min(best_position, self.sorted_positions[left])
+            left -= 1
+        while right < len(keys) and abs(keys[right] - target) == best_difference:
+            best_position = self.sorted_positions[right] if best_position is None else min(best_position, self.sorted_positions[right])
+            right += 1
+        return self.result_series[best_position]
+
+
+# کش ایندکس‌های جستجو: id(شیت) -> (weakref شیت، ابعاد شیت، {(ستون جستجو، ستون نتیجه): LookupIndex})
+_lookup_indexes = {}
+
+
+def clear_lookup_cache(df=None):
+    """پاک کردن ایندکس‌های جستجوی یک شیت (یا همه شیت‌ها)؛ بعد از تغییر درجای شیت باید صدا زده شود."""
+    if df is None:
+        _lookup_indexes.clear()
+    else:
+        _lookup_indexes.pop(id(df), None)
+
+
+def get_lookup_index(df, lookup_column_letter, result_column_letter):
+    """
+    ایندکس جستجو برای (شیت، ستون جستجو، ستون نتیجه) را یک بار می‌سازد و نگه می‌دارد.
+    اگر شیت عوض شود (شیء جدید یا ابعاد متفاوت) ایندکس‌های قبلی کنار گذاشته می‌شوند.
+    """
+    lookup_col_idx = find_alphabet_position(lookup_column_letter) - 1
+    result_col_idx = find_alphabet_position(result_column_letter) - 1
+
+    entry = _lookup_indexes.get(id(df))
+    if entry is None or entry[0]() is not df or entry[1] != df.shape:
+        entry = (weakref.ref(df), df.shape, {})
+        _lookup_indexes[id(df)] = entry
+        weakref.finalize(df, _lookup_indexes.pop, id(df), None)
+
+    indexes = entry[2]
+    key = (lookup_col_idx, result_col_idx)
+    if key not in indexes:
+        # در Pandas، با توجه به اینکه DataFrame بدون هدر خوانده شده، از iloc استفاده می‌کنیم.
+        indexes[key] = LookupIndex(df.iloc[:, lookup_col_idx].tolist(), df.iloc[:, result_col_idx].tolist())
+        instruments.count('lookup_index_builds')
+    else:
+        instruments.count('lookup_index_hits')
+    return indexes[key]
+
+
+def vlookup_in_python_pandas(df, lookup_value, lookup_column_letter, result_column_letter, exact_match=False):
+    """
+    شبیه‌سازی VLOOKUP با Pandas DataFrame.
+    
+    :param df: DataFrame که جستجو در آن انجام می‌شود (همانند sheet).
+    :param lookup_value: مقداری که به دنبال آن هستیم.
+    :param lookup_column_letter: ستون جستجو (مثلاً 'A').
+    :param result_column_letter: ستون نتیجه (مثلاً 'B').
+    :param exact_match: اگر True باشد، جستجوی دقیق انجام می‌شود.
+    :return: مقدار پیدا شده یا None.
+    """
+    instruments.count('lookups')
+    try:
+        index = get_lookup_index(df, lookup_column_letter, result_column_letter)
+
+        if exact_match:
+            # جستجوی دقیق
+            return index.exact(lookup_value)
+        else:
+            # جستجوی تقریبی (نزدیکترین مقدار)
+            return index.nearest(lookup_value)
+
+    except Exception as e:
+        logger.exception("یک خطا در VLOOKUP رخ داد: %s", e)
+        return None
+
+
+
+
+# --- کش ستونی شیت‌های خوانده‌شده ---
+# بیشتر زمان اجرا صرف رمزگشایی فایل اکسل با read_excel می‌شود. شیت‌های خوانده‌شده به صورت
+# ستونی (یک آرایه NumPy برای هر ستون در یک فایل npz.) ذخیره می‌شوند و اجرای دوباره روی همان فایل
+# (مثلاً با تنظیمات پلتفرم دیگر) از کش خوانده می‌شود. کلید کش: مسیر، اندازه و زمان تغییر فایل
+# (و با content_hash هش SHA-256 محتوای فایل، که برای فایل‌های بزرگ در هر اجرا زمان می‌برد).
+# فایل کش فقط آرایه‌های نوع‌دار دارد و بدون pickle خوانده می‌شود (allow_pickle=False): ستون‌های object
+# سلول به سلول به نوع سلول و آرایه مقادیر هر نوع تبدیل می‌شوند. شیتی که سلول با نوع دیگری دارد کش نمی‌شود.
+
+SNAPSHOT_CACHE_VERSION = 2
+SNAPSHOT_CACHE_DIR_NAME = '.inv_cache'
+
+# نوع سلول‌های ستون‌های object و نام آرایه مقادیر هر نوع در فایل کش (None آرایه ندارد)
+_CELL_KINDS = {type(None): 0, float: 1, int: 2, bool: 3, str: 4, datetime: 5}
+_CELL_ARRAYS = (None, 'float', 'int', 'bool', 'str', 'datetime')
+_CELL_DTYPES = (None, 'float64', 'int64', 'bool', 'str', 'datetime64[us]')
+
+
+def default_snapshot_cache_dir(excel_file_name):
+    """پوشه پیش‌فرض کش: .inv_cache کنار فایل اکسل."""
+    return os.path.join(os.path.dirname(os.path.abspath(excel_file_name)), SNAPSHOT_CACHE_DIR_NAME)
+
+
+def _file_content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _short_hash(text, length):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:length]
+
+
+def _typed_array(values, dtype):
+    """آرایه نوع‌دار مقادیر یک نوع سلول؛ اگر برگرداندنش دقیقاً همان مقادیر را ندهد TypeError."""
+    try:
+        array = np.array(values, dtype=dtype)
+    except (OverflowError, ValueError) as e:
+        raise TypeError(f"cells cannot be stored as {dtype}: {e}") from e
+    # رشته‌های با \0 انتهایی، تاریخ با منطقه زمانی یا دقت نانوثانیه و ... بعد از تبدیل همان مقدار نیستند
+    # (np.datetime64 با datetime برابر نیست، پس تاریخ‌ها به صورت Timestamp مقایسه می‌شوند)
+    if dtype == 'str' and array.tolist() != values:
+        raise TypeError(f"cells cannot be stored as {dtype} without changing them")
+    if dtype == 'datetime64[us]' and list(map(pd.Timestamp, array.tolist())) != list(map(pd.Timestamp, values)):
+        raise TypeError(f"cells cannot be stored as {dtype} without changing them")
+    return array
+
+
+def _encode_cells(name, values, arrays):
+    """ستون object: نوع هر سلول (name_kind) و آرایه مقادیر هر نوع (مثلاً name_str) در arrays."""
+    kinds = np.fromiter(map(_CELL_KINDS.get, map(type, values), itertools.repeat(-1)), dtype=np.int8,
+                        count=len(values))
+    for i in np.flatnonzero(kinds < 0).tolist():
+        # pd.Timestamp (زیرکلاس datetime) و np.datetime64 مثل datetime ذخیره و datetime خوانده می‌شوند؛
+        # تاریخ با منطقه زمانی ذخیره نمی‌شود
+        if not isinstance(values[i], (datetime, np.datetime64)) or getattr(values[i], 'tzinfo', None) is not None:
+            raise TypeError(f"cell of type {type(values[i]).__name__} cannot be cached")
+        kinds[i] = _CELL_KINDS[datetime]
+    arrays[f'{name}_kind'] = kinds
+    for kind, suffix in enumerate(_CELL_ARRAYS):
+        if suffix is not None and (kinds == kind).any():
+            arrays[f'{name}_{suffix}'] = _typed_array(values[kinds == kind].tolist(), _CELL_DTYPES[kind])
+
+
+def _decode_cells(name, data):
+    kinds = data[f'{name}_kind']
+    values = np.empty(len(kinds), dtype=object)
+    for kind, suffix in enumerate(_CELL_ARRAYS):
+        if suffix is not None and f'{name}_{suffix}' in data:
+            # جایگذاری در آرایه object مقادیر پایتونی می‌سازد (float، int، str، datetime)
+            values[kinds == kind] = data[f'{name}_{suffix}']
+    return values
+
+
+def _save_frame_snapshot(path, df):
+    """
+    ذخیره ستونی یک DataFrame به صورت اتمیک: ستون عددی، منطقی یا تاریخ همان آرایه خودش است و ستون object یا
+    رشته‌ای با _encode_cells ذخیره می‌شود. شیتی که قابل ذخیره بدون pickle نیست TypeError می‌دهد.
+    """
+    if not all(isinstance(label, int) for label in df.columns.tolist() + df.index.tolist()):
+        raise TypeError("only sheets with integer column and row labels are cached")
+    arrays = {
+        '__columns__': np.asarray(df.columns.tolist(), dtype=np.int64),
+        '__index__': np.asarray(df.index.tolist(), dtype=np.int64),
+        '__dtypes__': np.asarray([str(dtype) for dtype in df.dtypes], dtype=str),
+    }
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufmM':
+            arrays[f'c{i}'] = column.to_numpy()
+        elif column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            _encode_cells(f'c{i}', column.to_numpy(dtype=object), arrays)
+        else:
+            raise TypeError(f"column dtype {column.dtype} cannot be cached")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _load_frame_snapshot(path):
+    with np.load(path, allow_pickle=False) as data:
+        columns = data['__columns__'].tolist()
+        dtypes = data['__dtypes__'].tolist()
+        index = pd.Index(data['__index__'])
+        if index.equals(pd.RangeIndex(len(index))):
+            index = pd.RangeIndex(len(index))
+        frame = {}
+        for i, dtype in enumerate(dtypes):
+            if f'c{i}' in data:
+                frame[i] = data[f'c{i}']
+            else:
+                values = _decode_cells(f'c{i}', data)
+                frame[i] = pd.Series(values, index=index, dtype=None if dtype == 'object' else dtype)
+        df = pd.DataFrame(frame, index=index)
+    df.columns = columns
+    return df
+
+
+def clear_snapshot_cache(cache_dir):
+    """پاک کردن همه شیت‌های کش شده در یک پوشه کش؛ تعداد فایل‌های پاک‌شده را برمی‌گرداند."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz'):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+
+def _read_sheets(excel_file_name, sheet_names, read_plans):
+    """خواندن شیت‌ها از فایل؛ شیت‌هایی که read_plan دارند فقط با ستون‌ها و ردیف‌های لازم خوانده می‌شوند."""
+    if not any(sheet_name in read_plans for sheet_name in sheet_names):
+        return pd.read_excel(excel_file_name, sheet_name=list(sheet_names), header=None)
+    sheets = {}
+    with pd.ExcelFile(excel_file_name) as book:
+        for sheet_name in sheet_names:
+            read_plan = read_plans.get(sheet_name)
+            if read_plan is None:
+                sheets[sheet_name] = pd.read_excel(book, sheet_name=sheet_name, header=None)
+            else:
+                sheets[sheet_name] = read_planned_sheet(book, sheet_name, read_plan)
+    return sheets
+
+
+def read_workbook_sheets(excel_file_name, sheet_names, use_cache=True, cache_dir=None, read_plans=None,
+                         content_hash=False):
+    """
+    خواندن چند شیت یک فایل اکسل (بدون سرفصل، مثل قبل) با استفاده از کش ستونی.
+    use_cache=False کش را کاملاً نادیده می‌گیرد (نه می‌خواند و نه می‌نویسد).
+    read_plans: دیکشنری نام شیت -> SheetReadPlan برای خواندن فقط بخش لازم شیت (بخشی از کلید کش است).
+    content_hash: هش محتوای فایل هم جزو کلید کش باشد (برای جایی که به زمان تغییر فایل اطمینان نیست).
+    خروجی: دیکشنری نام شیت -> DataFrame
+    """
+    read_plans = read_plans or {}
+    if not use_cache:
+        return _read_sheets(excel_file_name, sheet_names, read_plans)
+
+    stat = os.stat(excel_file_name)
+    absolute_path = os.path.abspath(excel_file_name)
+    content_hash = _file_content_hash(excel_file_name) if content_hash else None
+    cache_dir = cache_dir or default_snapshot_cache_dir(excel_file_name)
+    path_tag = _short_hash(absolute_path, 16)
+
+    sheets = {}
+    cache_paths = {}
+    for sheet_name in sheet_names:
+        key = json.dumps([absolute_path, stat.st_size, stat.st_mtime_ns, content_hash,
+                          str(sheet_name), read_plans.get(sheet_name), SNAPSHOT_CACHE_VERSION])
+        prefix = f"{path_tag}_{_short_hash(str(sheet_name), 8)}_"
+        cache_paths[sheet_name] = (prefix, os.path.join(cache_dir, f"{prefix}{_short_hash(key, 32)}.npz"))
+        try:
+            sheets[sheet_name] = _load_frame_snapshot(cache_paths[sheet_name][1])
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+
+    missing = [sheet_name for sheet_name in sheet_names if sheet_name not in sheets]
+    if missing:
+        loaded = _read_sheets(excel_file_name, missing, read_plans)
+        os.makedirs(cache_dir, exist_ok=True)
+        for sheet_name in missing:
+            sheets[sheet_name] = loaded[sheet_name]
+            prefix, cache_path = cache_paths[sheet_name]
+            # نسخه‌های قدیمی همین شیت از همین فایل دیگر لازم نیستند
+            for name in os.listdir(cache_dir):
+                if name.startswith(prefix) and name.endswith('.npz'):
+                    os.remove(os.path.join(cache_dir, name))
+            try:
+                _save_frame_snapshot(cache_path, loaded[sheet_name])
+            except TypeError as e:
+                logger.info("sheet %r is not cached: %s", sheet_name, e)
+    return sheets
+
+
+# --- بارگذاری یکجای جدول محصولات (ستونی) ---
+# به جای ساختن آدرس A1 برای هر سلول هر محصول در هر پلتفرم، ستون‌ها یک بار با
+# اندیس‌گذاری گام‌دار (product_gap) برش زده می‌شوند و همه پلتفرم‌ها از همین جدول استفاده می‌کنند.
+
+SKU_FIELD_REFS = ('sap_code', 'Av_sales', 'inv', 'box', 'row', 'pallet', 'shelf_life',
+                  'FOS', 'safty_stock', 'sales_trend', 'open_order')
+
+
+def read_db_settings(df_sheet_db, num_of_days=SALES_TREND_DAYS):
+    """
+    خواندن lead_time، product_gap و آدرس شروع ستون‌های محصول از شیت DB.
+    آدرس‌ها همین‌جا به نقشه شیت (compile_sheet_layout) تبدیل می‌شوند تا آدرس نامعتبر قبل از خواندن شیت سفارش گزارش شود.
+    """
+    lead_time = int(vlookup_in_python_pandas(df_sheet_db, 'lead_time', 'z', 'AA', True))
+
+    product_gap_ref = vlookup_in_python_pandas(df_sheet_db, 'product_gap', 'z', 'AA', True)
+    product_gap = int(product_gap_ref) if product_gap_ref is not None and str(product_gap_ref).isdigit() else 9 # مقدار پیش‌فرض 9
+
+    refs = {name: vlookup_in_python_pandas(df_sheet_db, name, 'Z', 'AA', True) for name in SKU_FIELD_REFS}
+    layout = compile_sheet_layout(refs, product_gap, num_of_days)
+    return {'lead_time': lead_time, 'product_gap': product_gap, 'refs': refs, 'layout': layout}
+
+
+def _ref_position(excel_ref):
+    """تبدیل آدرس A1 به (ردیف، ستون) با اندیس صفر؛ برای آدرس نامعتبر None برمی‌گرداند."""
+    try:
+        return parse_a1(excel_ref)
+    except ValueError:
+        return None
+
+
+# نقشه کامپایل‌شده شیت سفارش: برای هر فیلد ردیف پایه و ستون شروع (اندیس صفرمبنا) و تعداد ستون‌ها؛
+# ردیف محصول iام هر فیلد row + i * product_gap است.
+FieldLayout = namedtuple('FieldLayout', ['row', 'col', 'span'])
+SheetLayout = namedtuple('SheetLayout', ['product_gap', 'num_of_days', 'fields'])
+
+# فیلدهای سری روزانه (num_of_days ستون از آدرس شروع)
+_SERIES_FIELDS = ('sales_trend', 'open_order')
+
+
+def _is_missing_ref(excel_ref):
+    return excel_ref is None or (isinstance(excel_ref, float) and math.isnan(excel_ref))
+
+
+def compile_sheet_layout(refs, product_gap, num_of_days=SALES_TREND_DAYS):
+    """
+    تبدیل یک‌باره آدرس‌های شیت DB به SheetLayout.
+    فیلدی که آدرس ندارد در نقشه نیست (مقدار پیش‌فرض آن فیلد استفاده می‌شود)؛ آدرس نامعتبر، نبودن sap_code،
+    product_gap غیرمثبت یا سری روزانه‌ای که از آخرین ستون اکسل بیرون می‌زند همه با هم در یک ValueError گزارش می‌شوند.
+    """
+    errors = []
+    if product_gap <= 0:
+        errors.append(f"product_gap must be positive, got {product_gap}")
+    fields = {}
+    for name in SKU_FIELD_REFS:
+        excel_ref = refs.get(name)
+        if _is_missing_ref(excel_ref):
+            if name == 'sap_code':
+                errors.append("sap_code: reference is missing")
+            continue
+        try:
+            row, col = parse_a1(excel_ref)
+        except ValueError as error:
+            errors.append(f"{name}: {error}")
+            continue
+        span = num_of_days if name in _SERIES_FIELDS else 1
+        if col + span > EXCEL_MAX_COLUMNS:
+            errors.append(f"{name}: {num_of_days} days from {excel_ref!r} run past the last Excel column")
+            continue
+        fields[name] = FieldLayout(row, col, span)
+    if errors:
+        raise ValueError("invalid sheet layout: " + "; ".join(errors))
+    return SheetLayout(product_gap, num_of_days, fields)
+
+
+SheetReadPlan = namedtuple('SheetReadPlan', ['columns', 'first_row', 'product_gap', 'row_offsets', 'numeric_columns'])
+
+# فیلدهایی که متن یا شناسه‌اند و تبدیل عددی نمی‌شوند (کد 123 نباید 123.0 شود)
+_LABEL_FIELDS = ('sap_code', 'FOS')
+
+
+def sheet_read_plan(layout):
+    """
+    ستون‌ها و ردیف‌هایی از شیت سفارش که load_sku_table واقعاً می‌خواند (از روی SheetLayout).
+    ردیف‌ها از کمترین ردیف آدرس‌ها شروع می‌شوند و با گام product_gap تکرار می‌شوند.
+    """
+    product_gap = layout.product_gap
+    field_cells = {name: (field.row, range(field.col, field.col + field.span)) for name, field in layout.fields.items()}
+
+    first_row = min(row for row, _ in field_cells.values())
+    label_columns = {col for name in _LABEL_FIELDS if name in field_cells for col in field_cells[name][1]}
+    columns = sorted({col for _, cols in field_cells.values() for col in cols})
+    return SheetReadPlan(
+        columns=columns,
+        first_row=first_row,
+        product_gap=product_gap,
+        row_offsets=sorted({(row - first_row) % product_gap for row, _ in field_cells.values()}),
+        numeric_columns=[col for col in columns if col not in label_columns],
+    )
+
+
+# کل شیت (همه ردیف‌ها و ستون‌ها، بدون تبدیل عددی)؛ برای خواندن شیت سفارش پیش از خواندن شیت DB
+WHOLE_SHEET_PLAN = SheetReadPlan(columns=None, first_row=0, product_gap=1, row_offsets=[0], numeric_columns=[])
+
+
+def _planned_row_labels(read_plan, count):
+    """شماره ردیف اصلی (با اندیس صفر) count ردیف اول خوانده‌شده با read_plan."""
+    steps, offsets = np.divmod(np.arange(count), len(read_plan.row_offsets))
+    return read_plan.first_row + steps * read_plan.product_gap + np.asarray(read_plan.row_offsets)[offsets]
+
+
+def read_planned_sheet(excel_file, sheet_name, read_plan):
+    """
+    خواندن فقط ستون‌ها و ردیف‌های read_plan از یک شیت (بدون سرفصل).
+    اندیس ردیف و نام ستون‌ها همان شماره‌های شیت کامل است، پس _take_cells بدون تغییر کار می‌کند.
+    ستون‌های عددی که فقط عدد دارند مستقیماً float می‌شوند؛ ستون‌هایی که متن دارند object می‌مانند
+    تا منطق هر فیلد برای متن (مثلاً safe_get_value) مثل قبل اجرا شود.
+    """
+    if read_plan.columns is None:
+        return pd.read_excel(excel_file, sheet_name=sheet_name, header=None, dtype=object)
+    columns = set(read_plan.columns)
+    offsets = set(read_plan.row_offsets)
+    first_row, product_gap = read_plan.first_row, read_plan.product_gap
+    df = pd.read_excel(
+        excel_file, sheet_name=sheet_name, header=None, dtype=object,
+        usecols=lambda col: col in columns,
+        skiprows=lambda row: row < first_row or (row - first_row) % product_gap not in offsets,
+    )
+    df.index = _planned_row_labels(read_plan, len(df))
+    return _to_numeric_columns(df, read_plan)
+
+
+def _to_numeric_columns(df, read_plan):
+    """ستون‌های عددی read_plan که فقط عدد دارند float می‌شوند (بقیه object می‌مانند)."""
+    for col in read_plan.numeric_columns:
+        if col in df.columns and pd.api.types.infer_dtype(df[col], skipna=True) in (
+                'integer', 'floating', 'mixed-integer-float', 'empty'):
+            df[col] = df[col].astype(float)
+    return df
+
+
+def narrow_to_read_plan(df, read_plan):
+    """
+    برش شیتی که کامل (با WHOLE_SHEET_PLAN) خوانده شده به همان ردیف‌ها، ستون‌ها و نوع ستون‌هایی که
+    read_planned_sheet با read_plan می‌دهد؛ برای وقتی که شیت قبل از معلوم شدن read_plan خوانده می‌شود.
+    """
+    rows = df.index.to_numpy()
+    keep = (rows >= read_plan.first_row) & np.isin(
+        (rows - read_plan.first_row) % read_plan.product_gap, read_plan.row_offsets)
+    columns = [col for col in read_plan.columns if col in df.columns]
+    return _to_numeric_columns(df.loc[keep, columns], read_plan)
+
+
+def _take_cells(df, rows, cols):
+    """
+    برداشتن یکجای سلول‌های (rows × cols) از DataFrame به صورت آرایه object.
+    سلول‌های خارج از محدوده DataFrame مثل get_value_by_excel_ref مقدار None می‌گیرند.
+    """
+    block = np.full((len(rows), len(cols)), None, dtype=object)
+    row_pos = df.index.get_indexer(rows)
+    col_pos = df.columns.get_indexer(cols)
+    row_ok = row_pos >= 0
+    col_ok = col_pos >= 0
+    instruments.count('cells_read', int(row_ok.sum()) * int(col_ok.sum()))
+    if row_ok.any() and col_ok.any():
+        block[np.ix_(row_ok, col_ok)] = df.iloc[row_pos[row_ok], col_pos[col_ok]].to_numpy(dtype=object)
+    return block
+
+
+def _take_field(df, layout, name, rows_offset):
+    """ستون یک فیلد محصول (مثلاً 'inv') برای همه محصولات."""
+    field = layout.fields.get(name)
+    if field is None:
+        return np.full(len(rows_offset), None, dtype=object)
+    return _take_cells(df, rows_offset + field.row, [field.col])[:, 0]
+
+
+def _is_number_cell(value):
+    return isinstance(value, (int, float)) and pd.notna(value)
+
+
+def _is_none(values):
+    return np.array([value is None for value in values], dtype=bool)
+
+
+def _is_text_or_none(value):
+    return value is None or isinstance(value, str)
+
+
+def _take_series_block(df, rows, first_col, num_of_days):
+    """
+    برداشتن یک سری روزانه (rows × num_of_days از ستون first_col به بعد) در آرایه‌های float پیوسته.
+    خروجی (numbers, is_number, is_text_or_missing):
+      numbers: مقدار float هر خانه (NaN برای خانه‌های غیرقابل تبدیل)
+      is_number: خانه واقعاً عدد است (مثل _is_number_cell)
+      is_text_or_missing: خانه متن است یا خارج از شیت است (بار در راه این خانه‌ها صفر است)
+    ستون‌های عددی (float/int/bool) یکجا تبدیل می‌شوند؛ فقط ستون‌های object خانه به خانه بررسی می‌شوند.
+    """
+    shape = (len(rows), num_of_days)
+    numbers = np.full(shape, np.nan)
+    is_number = np.zeros(shape, dtype=bool)
+    is_text_or_missing = np.ones(shape, dtype=bool)
+    row_pos = df.index.get_indexer(rows)
+    row_ok = np.flatnonzero(row_pos >= 0)
+    col_pos = df.columns.get_indexer(np.arange(first_col, first_col + num_of_days))
+    for day in np.flatnonzero(col_pos >= 0):
+        column = df.iloc[row_pos[row_ok], col_pos[day]]
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            values = column.to_numpy(dtype=float, na_value=np.nan)
+            numbers[row_ok, day] = values
+            is_number[row_ok, day] = ~np.isnan(values)
+            is_text_or_missing[row_ok, day] = False
+        else:
+            cells = column.to_numpy(dtype=object)
+            numbers[row_ok, day] = _map_cells(_to_float, cells).astype(float)
+            is_number[row_ok, day] = _map_cells(_is_number_cell, cells).astype(bool)
+            is_text_or_missing[row_ok, day] = _map_cells(_is_text_or_none, cells).astype(bool)
+    instruments.count('cells_read', len(row_ok) * int((col_pos >= 0).sum()))
+    return numbers, is_number, is_text_or_missing
+
+
+def load_sku_table(df_sheet, df_sheet_db, layout):
+    """
+    خواندن یکجای همه محصولات شیت سفارش (با نقشه SheetLayout) به یک جدول ستونی و دو ماتریس (محصول × روز).
+    منطق پیش‌فرض‌ها (فروش کم‌داده با میانگین پر می‌شود، باکس/پالت صفر = 1، موجودی اطمینان محصول یا جدول x/y)
+    همان منطق حلقه قبلی main است.
+    """
+    product_gap, num_of_days = layout.product_gap, layout.num_of_days
+
+    # تعداد محصولات: تا اولین کد خالی یا پایان شیت
+    sap_row, sap_col = layout.fields['sap_code'][:2]
+    last_row = int(df_sheet.index.max()) + 1 if len(df_sheet.index) else 0
+    rows_offset = np.arange(0, max(last_row - sap_row, 0), product_gap)
+    product_codes = _take_cells(df_sheet, rows_offset + sap_row, [sap_col])[:, 0]
+    stop = [code is None or str(code).strip() == "" for code in product_codes]
+    if any(stop):
+        rows_offset = rows_offset[:stop.index(True)]
+        product_codes = product_codes[:len(rows_offset)]
+
+    avg_daily_sales = _take_field(df_sheet, layout, 'Av_sales', rows_offset)
+    avg_daily_sales = _as_float_array(np.where(_is_none(avg_daily_sales), 0, avg_daily_sales))
+    initial_stock = _take_field(df_sheet, layout, 'inv', rows_offset)
+    initial_stock = _as_float_array(np.where(_is_none(initial_stock), 0, initial_stock))
+
+    box_size = _take_field(df_sheet, layout, 'box', rows_offset)
+    box_size = _as_float_array(np.where(_is_none(box_size) | (box_size == 0), 1, box_size))
+    pallet_size = _take_field(df_sheet, layout, 'pallet', rows_offset)
+    pallet_size = _as_float_array(np.where(_is_none(pallet_size) | (pallet_size == 0), 1, pallet_size))
+    row_size = _as_float_array(_map_cells(safe_get_value, _take_field(df_sheet, layout, 'row', rows_offset)))
+    shelf_life = _take_field(df_sheet, layout, 'shelf_life', rows_offset)
+    fos = _take_field(df_sheet, layout, 'FOS', rows_offset)
+
+    # --- داده‌های سری زمانی (فروش و بار در راه): آرایه‌های float پیوسته (محصول × روز) ---
+    daily_sales = np.empty((len(rows_offset), num_of_days))
+    sales_field = layout.fields.get('sales_trend')
+    if sales_field is None:
+        daily_sales[:] = avg_daily_sales[:, None]
+    else:
+        sales, is_number, _ = _take_series_block(
+            df_sheet, rows_offset + sales_field.row, sales_field.col, num_of_days)
+        # مثل حلقه قبلی: از اولین سلول غیرعددی به بعد، روزها با میانگین فروش پر می‌شوند
+        np.copyto(daily_sales, np.where(np.logical_and.accumulate(is_number, axis=1), sales, avg_daily_sales[:, None]))
+
+    daily_incoming = np.zeros((len(rows_offset), num_of_days))
+    open_order_field = layout.fields.get('open_order')
+    if open_order_field is not None:
+        incoming, _, is_text_or_missing = _take_series_block(
+            df_sheet, rows_offset + open_order_field.row, open_order_field.col, num_of_days)
+        # متن و خانه خالی بیرون از شیت صفر؛ خانه خالی داخل شیت (NaN) مثل قبل NaN می‌ماند
+        np.copyto(daily_incoming, incoming, where=~is_text_or_missing)
+
+    # --- موجودی اطمینان: مقدار خود محصول یا روزهای جدول x/y بر اساس Shelf Life ---
+    safety_stock_days_by_shelf_life = {}
+    y_data = None
+    safety_stock_days = np.zeros(len(rows_offset))
+    for i, shelf in enumerate(shelf_life):
+        if shelf not in safety_stock_days_by_shelf_life:
+            x_val = vlookup_in_python_pandas(df_sheet_db, shelf, 'x', 'y')
+            if x_val is None:
+                if y_data is None:
+                    y_data = df_sheet_db.iloc[1:, column_index('Y')].tolist()
+                    y_data = [x for x in y_data if x is not None]
+                x_val = max(y_data)
+            safety_stock_days_by_shelf_life[shelf] = float(x_val) if x_val is not None else 0
+        safety_stock_days[i] = safety_stock_days_by_shelf_life[shelf]
+    safety_stock_sku = _as_float_array(_take_field(df_sheet, layout, 'safty_stock', rows_offset))
+    with np.errstate(invalid='ignore'):
+        safety_stock = np.where(safety_stock_sku > 0, safety_stock_sku, safety_stock_days)
+
+    code_ids, codes = encode_product_codes(product_codes)
+    records = np.zeros(len(rows_offset), dtype=np.dtype(list(SKU_RECORD_FIELDS)))
+    records['row'] = rows_offset + sap_row + 1
+    records['code_id'] = code_ids
+    records['avg_daily_sales'] = avg_daily_sales
+    records['initial_stock'] = initial_stock
+    records['box_size'] = box_size
+    records['row_size'] = row_size
+    records['pallet_size'] = pallet_size
+    records['shelf_life'] = _as_float_array(shelf_life)
+    records['safety_stock'] = safety_stock
+    records['is_trend'] = np.asarray(fos, dtype=object) == FOS_TREND
+    return SkuTable(records, codes, daily_sales, daily_incoming)
@@ -0,0 +1,381 @@
+"""اجرای برنامه سفارش یک فایل: خواندن ورودی‌ها، محاسبه (افزایشی) و نوشتن خروجی."""
+import os
+import hashlib
+import json
+from datetime import datetime
+from collections import namedtuple
+
+from .common import instruments, logger, np
+from .engine import (
+    _FINGERPRINT_FIELDS, SALES_TREND_DAYS, SKU_CHUNK_SIZE, OrderTable, SeriesPrefixSums,
+    calculate_platform_orders, plan_safety_stock, _sku_pool, sku_product_codes, sku_subset,
+)
+from .loader import (
+    WHOLE_SHEET_PLAN, default_snapshot_cache_dir, load_sku_table, narrow_to_read_plan, read_db_settings,
+    read_workbook_sheets, sheet_read_plan, _short_hash,
+)
+from .engine_check import (
+    MISMATCHES_SHOWN, compare_engines, format_mismatch, sample_code_groups, shadow_check,
+    write_engine_mismatches,
+)
+from .writers import BackgroundOrderWriter, open_order_writer, project_floor_stock, write_stock_projection
+from .settings import platform_schedule
+
+
+def run_engine_check(settings, candidate="batch", fraction=1.0, max_skus=None, seed=None, report_file_name=None):
+    """
+    مقایسه کامل موتور candidate با موتور مرجع روی فایل تنظیمات settings؛ خلاصه چاپ و اختلاف‌ها برگردانده می‌شوند.
+    report_file_name (اختیاری): همه اختلاف‌ها با ورودی‌هایشان در .csv یا .json ذخیره می‌شوند.
+    """
+    instruments.reset()
+    schedule = platform_schedule(settings['order_horizon'], settings['platforms'], settings['every_day'],
+                                 settings['gaps'])
+    lead_time, sku_table, _, _ = load_plan_inputs(
+        settings['file'], settings['sheet_name'], settings['db_sheet'], settings['cache'], settings['cache_dir'],
+        settings['days'], settings['cache_hash'])
+    sku_table = plan_safety_stock(sku_table, lead_time, settings['order_horizon'], settings['safety_stock'],
+                                  settings['service_level'], settings['mc_samples'], settings['seed'])
+    rows = sample_code_groups(sku_table, fraction, max_skus, seed)
+    with instruments.stage('check'):
+        mismatches = compare_engines(sku_table, lead_time, schedule, settings['every_day'], candidate, rows,
+                                     workers=settings['sku_workers'], chunk_size=settings['sku_chunk_size'])
+    print(f"{len(rows)} SKU row(s) x {len(schedule)} platform(s) checked ({candidate} vs scalar): "
+          f"{len(mismatches)} mismatch(es)")
+    for mismatch in mismatches[:MISMATCHES_SHOWN]:
+        print(format_mismatch(mismatch))
+    if len(mismatches) > MISMATCHES_SHOWN:
+        print(f"... and {len(mismatches) - MISMATCHES_SHOWN} more")
+    if report_file_name:
+        write_engine_mismatches(mismatches, report_file_name)
+        print(f"mismatch report written to {report_file_name}")
+    return mismatches
+
+
+# --- محاسبه افزایشی (فقط محصولات تغییرکرده) ---
+# سفارش هر محصول فقط به داده خودش و سفارش پلتفرم‌های قبلی همان کد محصول (از main_order) بستگی دارد.
+# پس ردیف‌های هم‌کد یک گروه‌اند و برای هر گروه یک اثرانگشت از همه ورودی‌هایش ساخته می‌شود. نتیجه
+# گروه‌هایی که اثرانگشتشان عوض نشده از اجرای قبلی خوانده می‌شود و بقیه دوباره محاسبه می‌شوند.
+
+RESULT_STORE_VERSION = 3
+
+
+def result_store_path(excel_file_name, sheet_name, cache_dir=None):
+    """مسیر فایل نتایج ذخیره‌شده یک شیت (در همان پوشه کش شیت‌ها)."""
+    cache_dir = cache_dir or default_snapshot_cache_dir(excel_file_name)
+    path_tag = _short_hash(os.path.abspath(excel_file_name), 16)
+    return os.path.join(cache_dir, f"results_{path_tag}_{_short_hash(str(sheet_name), 8)}.npz")
+
+
+def result_settings_key(lead_time, schedule, num_of_platforms, is_every_day, engine, db_sheet, layout):
+    """
+    تنظیمات سراسری اجرا؛ با تغییر هر کدام همه نتایج ذخیره‌شده کنار گذاشته می‌شوند.
+    layout نقشه کامپایل‌شده شیت (SheetLayout، شامل num_of_days) است که از شیت DB به نام db_sheet خوانده شده.
+    """
+    fields = {name: list(field) for name, field in sorted(layout.fields.items())}
+    return json.dumps([RESULT_STORE_VERSION, lead_time, [list(item) for item in schedule], num_of_platforms,
+                       is_every_day, engine, str(db_sheet), layout.product_gap, layout.num_of_days, fields])
+
+
+def sku_fingerprints(sku_table):
+    """
+    اثرانگشت گروه هر ردیف: فیلدهای محصول، روند فروش، بار در راه و موجودی اطمینان نهایی همه ردیف‌های هم‌کد
+    (به ترتیب شیت). ردیف‌های با کد NaN به هیچ سفارش دیگری وابسته نیستند و هر کدام یک گروه‌اند.
+    """
+    records = sku_table.records
+    numbers = np.ascontiguousarray(np.column_stack(
+        [records[name].astype(float) for name in _FINGERPRINT_FIELDS]
+        + [sku_table.daily_sales, sku_table.daily_incoming]))
+    row_digests = [
+        hashlib.blake2b(numbers[i].tobytes() + repr((code, is_trend)).encode('utf-8'), digest_size=16).digest()
+        for i, (code, is_trend) in enumerate(zip(sku_product_codes(sku_table).tolist(),
+                                                 records['is_trend'].tolist()))]
+
+    group_ids = records['code_id'].astype(np.int64)
+    missing = group_ids < 0
+    group_ids[missing] = group_ids.max(initial=-1) + 1 + np.arange(int(missing.sum()))
+    group_rows = {}
+    for i, group_id in enumerate(group_ids):
+        group_rows.setdefault(group_id, []).append(i)
+
+    fingerprints = np.empty(len(group_ids), dtype='U32')
+    for rows in group_rows.values():
+        fingerprints[rows] = hashlib.blake2b(b''.join(row_digests[i] for i in rows), digest_size=16).hexdigest()
+    return fingerprints
+
+
+def reuse_stored_results(path, settings_key, fingerprints, num_of_platforms):
+    """
+    ماتریس مقادیر سفارش (ردیف × پلتفرم) با نتایج ذخیره‌شده گروه‌های بدون تغییر و ماسک ردیف‌هایی که
+    باید دوباره محاسبه شوند. فایل نبودن، خراب بودن یا تنظیمات متفاوت یعنی محاسبه همه ردیف‌ها.
+    """
+    quantities = np.zeros((len(fingerprints), num_of_platforms), dtype=np.int64)
+    stale = np.ones(len(fingerprints), dtype=bool)
+    try:
+        with np.load(path) as data:
+            if str(data['settings']) != settings_key:
+                return quantities, stale
+            stored_fingerprints = data['fingerprints']
+            stored_quantities = data['quantities']
+    except (OSError, KeyError, ValueError):
+        return quantities, stale
+
+    # ردیف‌های هر گروه در فایل پشت سر هم و به ترتیب شیت ذخیره شده‌اند
+    stored_groups = {}
+    for i, fingerprint in enumerate(stored_fingerprints.tolist()):
+        stored_groups.setdefault(fingerprint, []).append(i)
+    group_rows = {}
+    for i, fingerprint in enumerate(fingerprints.tolist()):
+        group_rows.setdefault(fingerprint, []).append(i)
+    for fingerprint, rows in group_rows.items():
+        stored_rows = stored_groups.get(fingerprint)
+        if stored_rows is not None and len(stored_rows) == len(rows):
+            quantities[rows] = stored_quantities[stored_rows]
+            stale[rows] = False
+    return quantities, stale
+
+
+def save_stored_results(path, settings_key, fingerprints, quantities):
+    """ذخیره اتمیک اثرانگشت و مقدار سفارش همه ردیف‌ها برای اجرای بعدی."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez(f, settings=np.array(settings_key), fingerprints=fingerprints, quantities=quantities)
+    os.replace(temp_path, path)
+
+
+PlanInputs = namedtuple('PlanInputs', ['lead_time', 'sku_table', 'prefix_sums', 'layout'])
+
+
+def load_plan_inputs(excel_file_name, sheet_name='1000', sheet_name_data_base='DB', use_cache=True, cache_dir=None,
+                     num_of_days=SALES_TREND_DAYS, cache_hash=False):
+    """
+    خواندن فایل و ساختن داده‌های مشترک همه پلتفرم‌ها (و همه سناریوها): لیدتایم شیت DB، جدول محصولات
+    و جمع‌های تجمعی فروش و بار در راه. cache_hash همان content_hash در read_workbook_sheets است.
+    """
+    print(f"در حال بارگذاری فایل '{excel_file_name}'...")
+    # خواندن داده‌ها بدون سرفصل برای شبیه‌سازی دقیق آدرس‌دهی اکسل (A1-style)
+    # ابتدا شیت DB تا آدرس‌ها و product_gap معلوم شوند؛ سپس از شیت سفارش فقط ستون‌ها و ردیف‌های لازم
+    with instruments.stage('read_db'):
+        df_sheet_db = read_workbook_sheets(
+            excel_file_name, [sheet_name_data_base], use_cache=use_cache, cache_dir=cache_dir,
+            content_hash=cache_hash)[sheet_name_data_base]
+    
+    # --- خواندن مقادیر ثابت و تنظیمات از DB sheet (با vlookup_in_python_pandas) ---
+    with instruments.stage('config'):
+        db_settings = read_db_settings(df_sheet_db, num_of_days)
+        read_plan = sheet_read_plan(db_settings['layout'])
+    with instruments.stage('read_sheet'):
+        df_sheet = read_workbook_sheets(
+            excel_file_name, [sheet_name], use_cache=use_cache, cache_dir=cache_dir,
+            read_plans={sheet_name: read_plan}, content_hash=cache_hash)[sheet_name]
+
+    # --- خواندن یکجای داده‌های همه محصولات (برای همه پلتفرم‌ها مشترک است) ---
+    with instruments.stage('extract'):
+        sku_table = load_sku_table(df_sheet, df_sheet_db, db_settings['layout'])
+        # جمع‌های تجمعی فروش و بار در راه یک بار برای همه پلتفرم‌ها
+        prefix_sums = SeriesPrefixSums(sku_table.daily_sales, sku_table.daily_incoming)
+    instruments.count('skus', len(sku_table.records))
+    return PlanInputs(db_settings['lead_time'], sku_table, prefix_sums, db_settings['layout'])
+
+
+def _read_sheet_task(excel_file_name, sheet_name, read_plan, use_cache, cache_dir, cache_hash):
+    """خواندن یک شیت در پروسه کارگر (load_plan_inputs_pipelined)."""
+    read_plans = {sheet_name: read_plan} if read_plan is not None else None
+    return read_workbook_sheets(excel_file_name, [sheet_name], use_cache, cache_dir, read_plans,
+                                cache_hash)[sheet_name]
+
+
+def load_plan_inputs_pipelined(excel_file_name, sheet_name='1000', sheet_name_data_base='DB', use_cache=True,
+                               cache_dir=None, num_of_days=SALES_TREND_DAYS, cache_hash=False):
+    """
+    مثل load_plan_inputs ولی دو شیت هم‌زمان در دو پروسه خوانده می‌شوند. شیت سفارش منتظر شیت DB نمی‌ماند:
+    کامل خوانده می‌شود (WHOLE_SHEET_PLAN) و بعد از رسیدن شیت DB به read_plan بریده می‌شود (narrow_to_read_plan)،
+    پس زمان خواندن تقریباً زمان کندترین شیت است. مرحله‌های read_db و read_sheet زمان انتظار پروسه اصلی‌اند.
+    با یک CPU خواندن هم‌زمان فقط کندتر است، پس همان load_plan_inputs اجرا می‌شود.
+    """
+    import multiprocessing
+
+    if (os.cpu_count() or 1) < 2:
+        logger.info("pipelined loading needs at least 2 CPUs; reading the sheets one after another")
+        return load_plan_inputs(excel_file_name, sheet_name, sheet_name_data_base, use_cache, cache_dir, num_of_days,
+                                cache_hash)
+
+    print(f"در حال بارگذاری فایل '{excel_file_name}'...")
+    # خروج از with پروسه‌ها را متوقف می‌کند؛ اگر شیت DB خطا داشته باشد منتظر خواندن شیت سفارش نمی‌مانیم
+    with multiprocessing.Pool(2) as pool:
+        sheet_result = pool.apply_async(
+            _read_sheet_task, (excel_file_name, sheet_name, WHOLE_SHEET_PLAN, use_cache, cache_dir, cache_hash))
+        db_result = pool.apply_async(
+            _read_sheet_task, (excel_file_name, sheet_name_data_base, None, use_cache, cache_dir, cache_hash))
+        with instruments.stage('read_db'):
+            df_sheet_db = db_result.get()
+        with instruments.stage('config'):
+            db_settings = read_db_settings(df_sheet_db, num_of_days)
+            read_plan = sheet_read_plan(db_settings['layout'])
+        with instruments.stage('read_sheet'):
+            df_sheet = narrow_to_read_plan(sheet_result.get(), read_plan)
+
+    with instruments.stage('extract'):
+        sku_table = load_sku_table(df_sheet, df_sheet_db, db_settings['layout'])
+        prefix_sums = SeriesPrefixSums(sku_table.daily_sales, sku_table.daily_incoming)
+    instruments.count('skus', len(sku_table.records))
+    return PlanInputs(db_settings['lead_time'], sku_table, prefix_sums, db_settings['layout'])
+
+
+def plan_orders(sku_table, lead_time, schedule, is_every_day_platform="no", engine="batch", prefix_sums=None,
+                stored=None, verbose=True, writer=None, workers=1, chunk_size=SKU_CHUNK_SIZE):
+    """
+    محاسبه سفارش همه پلتفرم‌های schedule (خروجی platform_schedule) به ترتیب.
+    stored: خروجی reuse_stored_results (quantities، stale)؛ فقط ردیف‌های stale محاسبه و در quantities نوشته می‌شوند.
+    writer (OrderWriter): سفارش هر پلتفرم بلافاصله بعد از محاسبه در آن نوشته می‌شود.
+    workers > 1 (فقط موتور scalar): محصولات هر پلتفرم در تکه‌های chunk_size ردیفی در یک process pool با
+    workers پروسه محاسبه می‌شوند؛ پلتفرم‌ها مثل قبل به ترتیب و هر کدام بعد از تمام شدن قبلی.
+    خروجی (main_order، quantities): OrderTable و ماتریس مقدار سفارش (ردیف × پلتفرم).
+    """
+    num_of_platforms = len(schedule)
+    code_ids = sku_table.records['code_id']
+    # روی کل جدول شمرده می‌شود (نه فقط ردیف‌های دوباره محاسبه‌شده در حالت افزایشی)
+    skipped_fos = int((~sku_table.records['is_trend']).sum())
+    if stored is None:
+        quantities = np.zeros((len(code_ids), num_of_platforms), dtype=np.int64)
+        stale = np.ones(len(code_ids), dtype=bool)
+        stale_table, stale_prefix_sums = sku_table, prefix_sums
+    else:
+        quantities, stale = stored
+        stale_table = sku_subset(sku_table, np.flatnonzero(stale))
+        stale_prefix_sums = SeriesPrefixSums(stale_table.daily_sales, stale_table.daily_incoming)
+
+    # جدول نهایی سفارشات هر پلتفرم (آرایه‌ای، با همان فهرست کدهای جدول محصولات)
+    today = datetime.now().date()
+    main_order = OrderTable(sku_table.codes, today)
+
+    # --- شروع حلقه محاسبه سفارش برای هر پلتفرم ---
+    with _sku_pool(workers if engine == "scalar" else 1) as pool:
+        for platform_num, (current_order_horizon, what_next_platform) in enumerate(schedule):
+            platform_name = f"P{platform_num + 1}"
+
+            if verbose:
+                print(f"\n--- شروع سفارش‌گذاری برای پلتفرم {platform_num + 1} ---")
+                print(
+                    f"لیدتایم: {lead_time} روز و بازه سفارش‌گذاری: {current_order_horizon} روز")
+
+            # --- محاسبه سفارش همه محصولات این پلتفرم (هسته محاسباتی) ---
+            with instruments.stage('calculate'):
+                # در حالت افزایشی فقط ردیف‌های تغییرکرده محاسبه می‌شوند؛ main_order پلتفرم‌های قبلی کامل است
+                if stale.any():
+                    quantities[stale, platform_num] = calculate_platform_orders(
+                        stale_table,
+                        lead_time=lead_time,
+                        order_horizon=current_order_horizon,
+                        platform_num=platform_num,
+                        num_of_platforms=num_of_platforms,
+                        order_list=main_order,
+                        what_next_platform=what_next_platform,
+                        is_every_day=is_every_day_platform,
+                        engine=engine,
+                        prefix_sums=stale_prefix_sums,
+                        pool=pool,
+                        chunk_size=chunk_size,
+                    )
+                order_qty = quantities[:, platform_num]
+                ordered = np.flatnonzero(order_qty > 0)
+
+                # اضافه کردن سفارش‌های هر پلتفرم به جدول اصلی (تاریخ سفارش = امروز + بازه - 1)
+                main_order.add_platform(
+                    platform_name, code_ids[ordered], order_qty[ordered], current_order_horizon - 1)
+            instruments.count('orders', len(ordered))
+            instruments.count('skus_skipped_fos', skipped_fos)
+            if writer is not None:
+                with instruments.stage('write'):
+                    writer.write_columns(platform_name, *main_order.platform_columns(platform_name))
+    return main_order, quantities
+
+
+def load_incremental_results(sku_table, lead_time, schedule, is_every_day_platform, engine, layout,
+                             excel_file_name, sheet_name, db_sheet, cache_dir=None):
+    """
+    نتایج ذخیره‌شده اجرای قبلی برای محصولات بدون تغییر: (stored، store_results).
+    stored ورودی plan_orders است و store_results(quantities) نتایج این اجرا را برای اجرای بعدی ذخیره می‌کند.
+    """
+    with instruments.stage('fingerprint'):
+        store_path = result_store_path(excel_file_name, sheet_name, cache_dir)
+        settings_key = result_settings_key(
+            lead_time, schedule, len(schedule), is_every_day_platform, engine, db_sheet, layout)
+        fingerprints = sku_fingerprints(sku_table)
+        stored = reuse_stored_results(store_path, settings_key, fingerprints, len(schedule))
+    instruments.count('skus_recomputed', int(stored[1].sum()))
+    instruments.count('skus_reused', int((~stored[1]).sum()))
+    return stored, lambda quantities: save_stored_results(store_path, settings_key, fingerprints, quantities)
+
+
+def run_plan(order_horizon_in_days, num_of_platforms, is_every_day_platform="no", platform_gaps=(),
+             excel_file_name='1.xlsb', sheet_name='1000', sheet_name_data_base='DB',
+             output_file_name='suggested_orders_pandas.xlsx', engine="batch",
+             use_cache=True, cache_dir=None, cache_hash=False, incremental=True, num_of_days=SALES_TREND_DAYS,
+             projection_file_name=None, output_layout='single', safety_stock_mode='sheet',
+             service_level=0.95, monte_carlo_samples=1000, seed=0, shadow_fraction=0.0, shadow_max_skus=1000,
+             pipeline=False, sku_workers=1, sku_chunk_size=SKU_CHUNK_SIZE):
+    """
+    اجرای کامل سفارش‌گذاری بدون ورودی کاربر: خواندن فایل، محاسبه همه پلتفرم‌ها و نوشتن خروجی.
+    platform_gaps فاصله هر پلتفرم تا پلتفرم بعدی است (برای شعبه‌هایی که هر روز پلتفرم ندارند).
+    use_cache، cache_dir و cache_hash کش ستونی شیت‌ها را کنترل می‌کنند (read_workbook_sheets).
+    incremental (همراه با use_cache): فقط محصولاتی که ورودی‌شان از اجرای قبل عوض شده دوباره محاسبه می‌شوند.
+    num_of_days تعداد روزهای روند فروش و بار در راه هر محصول است (بازه‌های طولانی برای پلتفرم‌های هفتگی).
+    output_layout: چیدمان خروجی xlsx (single مثل قبل یا per_platform)؛ قالب خروجی از پسوند output_file_name است
+    و سفارش هر پلتفرم همان موقع که محاسبه شد نوشته می‌شود.
+    safety_stock_mode: sheet (مقادیر شیت) یا monte_carlo (plan_safety_stock با service_level،
+    monte_carlo_samples و seed).
+    projection_file_name: اگر داده شود کف انبار پیش‌بینی‌شده روزانه هر محصول با سفارش‌های برنامه ذخیره می‌شود.
+    shadow_fraction: کسری از کدهای محصول (حداکثر shadow_max_skus کد) که با موتور مرجع هم محاسبه و مقایسه
+    می‌شوند (shadow_check)؛ 0 یعنی خاموش.
+    pipeline: دو شیت هم‌زمان در دو پروسه خوانده می‌شوند (load_plan_inputs_pipelined) و سفارش هر پلتفرم
+    در یک thread پس‌زمینه نوشته می‌شود (BackgroundOrderWriter) در حالی که پلتفرم بعدی محاسبه می‌شود.
+    sku_workers و sku_chunk_size: تعداد پروسه‌ها و اندازه تکه‌های موتور scalar در هر پلتفرم (plan_orders).
+    زمان مراحل و شمارنده‌های اجرا در instruments جمع می‌شوند.
+    خطاها به فراخوان برگردانده می‌شوند و main_order (OrderTable) برگردانده می‌شود.
+    """
+    schedule = platform_schedule(order_horizon_in_days, num_of_platforms, is_every_day_platform, platform_gaps)
+    instruments.reset()
+
+    load_inputs = load_plan_inputs_pipelined if pipeline else load_plan_inputs
+    lead_time, sku_table, prefix_sums, layout = load_inputs(
+        excel_file_name, sheet_name, sheet_name_data_base, use_cache, cache_dir, num_of_days, cache_hash)
+    sku_table = plan_safety_stock(sku_table, lead_time, order_horizon_in_days, safety_stock_mode, service_level,
+                                  monte_carlo_samples, seed)
+
+    # --- نتایج اجرای قبلی برای محصولات بدون تغییر ---
+    stored, store_results = None, None
+    if incremental and use_cache:
+        stored, store_results = load_incremental_results(
+            sku_table, lead_time, schedule, is_every_day_platform, engine, layout,
+            excel_file_name, sheet_name, sheet_name_data_base, cache_dir)
+
+    writer = open_order_writer(output_file_name, output_layout)
+    if pipeline:
+        writer = BackgroundOrderWriter(writer)
+    try:
+        main_order, quantities = plan_orders(
+            sku_table, lead_time, schedule, is_every_day_platform, engine, prefix_sums, stored, writer=writer,
+            workers=sku_workers, chunk_size=sku_chunk_size)
+    except BaseException:
+        writer.abort()
+        raise
+    with instruments.stage('write'):
+        writer.close()
+
+    if store_results is not None:
+        store_results(quantities)
+    if shadow_fraction > 0 and engine != "scalar":
+        shadow_check(sku_table, lead_time, schedule, is_every_day_platform, quantities, shadow_fraction,
+                     shadow_max_skus)
+
+    print("\n--- محاسبات با موفقیت به پایان رسید. ---")
+    print(f"نتایج پیشنهادی سفارش در فایل {output_file_name} ذخیره شد.")
+    logger.debug("لیست تاپل‌های نهایی: %s", main_order)
+    print(f"فایل خروجی در مسیر: {os.path.abspath(output_file_name)}")
+    if projection_file_name:
+        with instruments.stage('projection'):
+            write_stock_projection(sku_table, project_floor_stock(sku_table, lead_time, quantities),
+                                   projection_file_name)
+        print(f"پیش‌بینی کف انبار در مسیر: {os.path.abspath(projection_file_name)}")
+    return main_order
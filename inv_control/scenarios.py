@@ -0,0 +1,176 @@
+"""مقایسه سناریوها (what-if) روی یک فایل."""
+import json
+import itertools
+
+from .common import instruments, pd
+from .engine import plan_safety_stock, with_safety_stock_days
+from .settings import PLAN_KEYS, platform_schedule, _read_json, _strict_int, validate_plan_settings
+from .planning import load_plan_inputs, plan_orders
+
+
+# فایل یک بار خوانده می‌شود و همه سناریوها (لیدتایم، روزهای موجودی اطمینان، فاصله پلتفرم‌ها، هر روزه یا نه)
+# از همان جدول محصولات و جمع‌های تجمعی استفاده می‌کنند؛ با چند worker سناریوها موازی اجرا می‌شوند.
+
+SCENARIO_KEYS = ('order_horizon', 'platforms', 'every_day', 'gaps', 'lead_time', 'safety_stock_days')
+
+SCENARIO_COLUMNS = ('name', 'lead_time', 'safety_stock_days', 'every_day', 'gaps',
+                    'units', 'pallets', 'skus', 'order_lines', 'error')
+
+
+def _scenario_name(scenario):
+    parts = []
+    for key, value in scenario.items():
+        if isinstance(value, (list, tuple)):
+            value = "-".join(str(item) for item in value)
+        parts.append(f"{key}={value}")
+    return ", ".join(parts) or "base"
+
+
+def expand_scenarios(spec):
+    """
+    تعریف سناریوها (JSON) به (تنظیمات پایه، لیست سناریوها):
+    - لیستی از سناریوها: [{"name": ..., "lead_time": 2, "gaps": [1, 2]}, ...]
+    - یا {"base": {...}, "grid": {"lead_time": [1, 2], "every_day": ["yes", "no"]}, "scenarios": [...]}
+      که همه ترکیب‌های grid به همراه سناریوهای صریح اجرا می‌شوند.
+    base همان کلیدهای تنظیمات اجرا را می‌پذیرد؛ هر سناریو فقط کلیدهای SCENARIO_KEYS و name را.
+    """
+    if isinstance(spec, list):
+        spec = {'scenarios': spec}
+    base = dict(spec.get('base', {}))
+    scenarios = [dict(scenario) for scenario in spec.get('scenarios', [])]
+    grid = spec.get('grid', {})
+    if grid:
+        keys = list(grid)
+        scenarios.extend(dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys)))
+    if not scenarios:
+        scenarios = [{}]
+
+    names = set()
+    for scenario in scenarios:
+        unknown = sorted(set(scenario) - set(SCENARIO_KEYS) - {'name'})
+        if unknown:
+            raise ValueError(f"unknown scenario setting(s): {', '.join(unknown)}")
+        scenario.setdefault('name', _scenario_name(scenario))
+        if scenario['name'] in names:
+            raise ValueError(f"duplicate scenario name {scenario['name']!r}")
+        names.add(scenario['name'])
+    return base, scenarios
+
+
+def _scenario_settings(base, scenario):
+    """تنظیمات کامل و بررسی‌شده یک سناریو (lead_time و safety_stock_days خالی یعنی مقدار خود فایل)."""
+    overrides = {key: value for key, value in scenario.items() if key in PLAN_KEYS}
+    extra = {key: base.get(key) for key in ('lead_time', 'safety_stock_days')}
+    extra.update({key: scenario[key] for key in ('lead_time', 'safety_stock_days') if key in scenario})
+    try:
+        settings = validate_plan_settings(
+            {**{key: value for key, value in base.items() if key in PLAN_KEYS}, **overrides})
+        if extra['lead_time'] is not None and _strict_int(extra['lead_time']) < 0:
+            raise ValueError(f"lead_time must be a non-negative integer, got {extra['lead_time']!r}")
+        if extra['safety_stock_days'] is not None and not float(extra['safety_stock_days']) >= 0:
+            raise ValueError(f"safety_stock_days must be a non-negative number, got {extra['safety_stock_days']!r}")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"scenario {scenario['name']!r}: {e or 'invalid value'}") from None
+    return {**settings, **extra, 'name': scenario['name']}
+
+
+def evaluate_scenario(inputs, settings):
+    """
+    محاسبه سفارش همه پلتفرم‌های یک سناریو روی داده‌های مشترک (PlanInputs) و خلاصه آن:
+    مجموع واحدها، تعداد پالت (مقدار سفارش / اندازه پالت هر محصول)، تعداد محصولات سفارش‌داده‌شده و ردیف‌های سفارش.
+    """
+    sku_table = inputs.sku_table
+    lead_time = inputs.lead_time if settings['lead_time'] is None else int(settings['lead_time'])
+    if settings['safety_stock_days'] is not None:
+        sku_table = with_safety_stock_days(sku_table, float(settings['safety_stock_days']))
+    else:
+        sku_table = plan_safety_stock(sku_table, lead_time, settings['order_horizon'], settings['safety_stock'],
+                                      settings['service_level'], settings['mc_samples'], settings['seed'])
+    row = {
+        'name': settings['name'],
+        'lead_time': lead_time,
+        'safety_stock_days': settings['safety_stock_days'],
+        'every_day': settings['every_day'],
+        'gaps': settings['gaps'],
+    }
+    schedule = platform_schedule(settings['order_horizon'], settings['platforms'], settings['every_day'],
+                                 settings['gaps'] if settings['every_day'] == 'no' else ())
+    try:
+        _, quantities = plan_orders(sku_table, lead_time, schedule, settings['every_day'], settings['engine'],
+                                    inputs.prefix_sums, verbose=False, workers=settings['sku_workers'],
+                                    chunk_size=settings['sku_chunk_size'])
+    except (IndexError, ValueError, ArithmeticError) as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+        return row
+    pallet_size = sku_table.records['pallet_size']
+    ordered = quantities > 0
+    row.update({
+        'units': int(quantities.sum()),
+        'pallets': round(float((quantities / pallet_size[:, None]).sum()), 2),
+        'skus': int(ordered.any(axis=1).sum()),
+        'order_lines': int(ordered.sum()),
+    })
+    return row
+
+
+# داده‌های مشترک سناریوها در هر پروسه کارگر (یک بار با initializer فرستاده می‌شود)
+_scenario_inputs = None
+
+
+def _init_scenario_worker(inputs):
+    global _scenario_inputs
+    _scenario_inputs = inputs
+
+
+def _evaluate_scenario_in_worker(settings):
+    return evaluate_scenario(_scenario_inputs, settings)
+
+
+def run_scenarios(spec, base_settings=None, max_workers=None):
+    """
+    اجرای همه سناریوهای spec (دیکشنری/لیست یا مسیر فایل JSON) روی یک فایل.
+    base_settings (مثلاً از خط فرمان) روی base خود spec اعمال می‌شود. فایل، شیت‌ها، موتور و تعداد روزها
+    برای همه سناریوها یکی است. خروجی: لیست ردیف‌های جدول مقایسه به ترتیب سناریوها.
+    """
+    if isinstance(spec, str):
+        spec = _read_json(spec)
+    base, scenarios = expand_scenarios(spec)
+    base.update(base_settings or {})
+    prepared = [_scenario_settings(base, scenario) for scenario in scenarios]
+
+    first = prepared[0]
+    instruments.reset()
+    inputs = load_plan_inputs(first['file'], first['sheet_name'], first['db_sheet'], first['cache'],
+                              first['cache_dir'], first['days'], first['cache_hash'])
+    if not max_workers or max_workers <= 1 or len(prepared) == 1:
+        return [evaluate_scenario(inputs, settings) for settings in prepared]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(prepared)),
+                             initializer=_init_scenario_worker, initargs=(inputs,)) as pool:
+        return list(pool.map(_evaluate_scenario_in_worker, prepared))
+
+
+def format_scenario_table(rows):
+    """جدول متنی فشرده مقایسه سناریوها."""
+    lines = [f"{'scenario':<36}{'units':>12}{'pallets':>12}{'skus':>8}{'lines':>8}"]
+    for row in rows:
+        if row.get('error'):
+            lines.append(f"{row['name'][:35]:<36}  {row['error']}")
+        else:
+            lines.append(f"{row['name'][:35]:<36}{row['units']:>12}{row['pallets']:>12.2f}"
+                         f"{row['skus']:>8}{row['order_lines']:>8}")
+    return "\n".join(lines)
+
+
+def write_scenario_table(rows, path):
+    """ذخیره جدول مقایسه به صورت JSON (پسوند .json) یا CSV."""
+    if path.lower().endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    else:
+        table = pd.DataFrame([{column: row.get(column) for column in SCENARIO_COLUMNS} for row in rows])
+        table = table.astype({'units': 'Int64', 'skus': 'Int64', 'order_lines': 'Int64'})
+        table['gaps'] = table['gaps'].map(lambda gaps: "-".join(str(gap) for gap in gaps))
+        table.to_csv(path, index=False, encoding='utf-8')
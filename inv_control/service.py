@@ -0,0 +1,292 @@
+"""سرویس محلی سفارش‌گذاری (HTTP)."""
+import os
+import json
+import time
+from datetime import datetime, timedelta
+from collections import namedtuple
+
+from .common import instruments, _lazy_import, logger, np
+from .engine import _code_key, plan_safety_stock, sku_product_codes
+from .settings import platform_schedule, _strict_int
+from .planning import load_incremental_results, load_plan_inputs, plan_orders
+
+# فقط زیرفرمان serve به آن نیاز دارد (import خود asyncio حدود ۵۰ میلی‌ثانیه است)
+asyncio = _lazy_import('asyncio')
+
+
+# فایل یک بار خوانده و محاسبه می‌شود و پرسش‌ها (سفارش چند محصول یا یک پلتفرم) از همان نتیجه در حافظه
+# جواب داده می‌شوند. تغییر فایل با بررسی دوره‌ای os.stat دیده می‌شود و محاسبه دوباره در پروسه کارگر اجرا می‌شود
+# تا حلقه asyncio و پرسش‌های دیگر معطل نمانند؛ تا پایان محاسبه جدید، نتیجه قبلی جواب داده می‌شود.
+#   GET  /health                      وضعیت سرویس و نتیجه فعلی
+#   GET  /orders?platform=3           سفارش‌های یک پلتفرم (فقط مقادیر مثبت)
+#   GET  /orders?sku=A&sku=B,C        سفارش محصولات در همه پلتفرم‌ها (یا فقط platform داده‌شده)، حتی صفر
+#   POST /reload                      محاسبه دوباره فوری
+
+PlanSnapshot = namedtuple('PlanSnapshot', ['file_state', 'lead_time', 'product_codes', 'row_of', 'quantities',
+                                           'order_dates', 'loaded_at', 'seconds'])
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def _file_state(path):
+    """اندازه و زمان تغییر فایل؛ تغییر هر کدام یعنی فایل باید دوباره خوانده شود."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def compute_plan_snapshot(settings):
+    """
+    خواندن فایل و محاسبه همه پلتفرم‌ها بدون نوشتن خروجی (در پروسه کارگر سرویس اجرا می‌شود).
+    کش شیت‌ها و محاسبه افزایشی مثل run_plan استفاده می‌شوند. کد تکراری، اولین ردیف را نگه می‌دارد.
+    """
+    started = time.perf_counter()
+    file_state = _file_state(settings['file'])
+    schedule = platform_schedule(settings['order_horizon'], settings['platforms'], settings['every_day'],
+                                 settings['gaps'])
+    instruments.reset()
+    lead_time, sku_table, prefix_sums, layout = load_plan_inputs(
+        settings['file'], settings['sheet_name'], settings['db_sheet'], settings['cache'], settings['cache_dir'],
+        settings['days'], settings['cache_hash'])
+    sku_table = plan_safety_stock(sku_table, lead_time, settings['order_horizon'], settings['safety_stock'],
+                                  settings['service_level'], settings['mc_samples'], settings['seed'])
+    stored, store_results = None, None
+    if settings['incremental'] and settings['cache']:
+        stored, store_results = load_incremental_results(
+            sku_table, lead_time, schedule, settings['every_day'], settings['engine'], layout,
+            settings['file'], settings['sheet_name'], settings['db_sheet'], settings['cache_dir'])
+    _, quantities = plan_orders(sku_table, lead_time, schedule, settings['every_day'], settings['engine'],
+                                prefix_sums, stored, verbose=False, workers=settings['sku_workers'],
+                                chunk_size=settings['sku_chunk_size'])
+    if store_results is not None:
+        store_results(quantities)
+
+    product_codes = [_code_key(code) for code in sku_product_codes(sku_table).tolist()]
+    row_of = {}
+    for row, code in enumerate(product_codes):
+        row_of.setdefault(code, row)
+    # تاریخ سفارش هر پلتفرم مثل plan_orders
+    today = datetime.now().date()
+    order_dates = [(today + timedelta(days=horizon - 1)).isoformat() for horizon, _ in schedule]
+    return PlanSnapshot(file_state, lead_time, product_codes, row_of, quantities, order_dates,
+                        datetime.now().isoformat(timespec='seconds'), round(time.perf_counter() - started, 3))
+
+
+class PlanningService:
+    """
+    نگهداری آخرین نتیجه محاسبه و جواب دادن پرسش‌ها از آن؛ محاسبه‌ها در ProcessPoolExecutor اجرا می‌شوند.
+    متدهای query_* همگام و بدون I/O هستند و مستقیم (بدون HTTP) هم قابل استفاده‌اند.
+    """
+
+    def __init__(self, settings, poll_interval=2.0, max_workers=1):
+        self.settings = settings
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.snapshot = None
+        self.last_error = None
+        self._attempted_state = None
+        self._executor = None
+        self._reload_lock = None
+        self.address = None
+
+    # --- محاسبه و بارگذاری دوباره ---
+
+    def _new_executor(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=self.max_workers)
+
+    async def reload(self):
+        """محاسبه دوباره در پروسه کارگر و جایگزینی نتیجه؛ در صورت خطا نتیجه قبلی باقی می‌ماند."""
+        from concurrent.futures.process import BrokenProcessPool
+
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            try:
+                self._attempted_state = _file_state(self.settings['file'])
+            except OSError:
+                self._attempted_state = None
+            loop = asyncio.get_running_loop()
+            try:
+                snapshot = await loop.run_in_executor(self._executor, compute_plan_snapshot, self.settings)
+            except BrokenProcessPool:
+                # پروسه کارگر از کار افتاده؛ pool برای بار بعد از نو ساخته می‌شود
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                self.last_error = "worker process crashed during recompute"
+                logger.error("planning service: %s", self.last_error)
+                return False
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.error("planning service: reload of %s failed: %s", self.settings['file'], self.last_error)
+                return False
+            self.snapshot = snapshot
+            self.last_error = None
+            logger.info("planning service: %d SKUs planned from %s in %.3fs",
+                        len(snapshot.product_codes), self.settings['file'], snapshot.seconds)
+            return True
+
+    async def watch(self):
+        """بررسی دوره‌ای فایل و محاسبه دوباره پس از تغییر (هر وضعیت فایل فقط یک بار امتحان می‌شود)."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                state = _file_state(self.settings['file'])
+            except OSError:
+                continue
+            if state != self._attempted_state:
+                await self.reload()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # --- پرسش‌ها ---
+
+    def health(self):
+        snapshot = self.snapshot
+        return {
+            'status': 'ok' if snapshot is not None else 'loading' if self.last_error is None else 'error',
+            'file': self.settings['file'],
+            'loaded_at': snapshot.loaded_at if snapshot else None,
+            'seconds': snapshot.seconds if snapshot else None,
+            'skus': len(snapshot.product_codes) if snapshot else 0,
+            'platforms': self.settings['platforms'],
+            'last_error': self.last_error,
+        }
+
+    def _platform_column(self, platform):
+        try:
+            platform = _strict_int(platform)
+        except (TypeError, ValueError):
+            raise ValueError(f"platform must be an integer, got {platform!r}") from None
+        if not 1 <= platform <= self.settings['platforms']:
+            raise ValueError(f"platform must be between 1 and {self.settings['platforms']}, got {platform}")
+        return platform - 1
+
+    def _order_row(self, snapshot, row, column):
+        return {'product_code': snapshot.product_codes[row], 'platform': f"P{column + 1}",
+                'date': snapshot.order_dates[column], 'quantity': int(snapshot.quantities[row, column])}
+
+    def query_platform(self, platform):
+        """سفارش‌های مثبت یک پلتفرم (شماره از 1)."""
+        snapshot = self.snapshot
+        column = self._platform_column(platform)
+        rows = np.flatnonzero(snapshot.quantities[:, column] > 0)
+        return {'loaded_at': snapshot.loaded_at, 'lead_time': snapshot.lead_time,
+                'orders': [self._order_row(snapshot, row, column) for row in rows]}
+
+    def query_skus(self, skus, platform=None):
+        """سفارش محصولات داده‌شده در همه پلتفرم‌ها یا فقط یک پلتفرم؛ کدهای ناشناخته در missing می‌آیند."""
+        snapshot = self.snapshot
+        columns = range(snapshot.quantities.shape[1]) if platform is None else [self._platform_column(platform)]
+        orders, missing = [], []
+        for sku in skus:
+            row = snapshot.row_of.get(sku)
+            if row is None:
+                missing.append(sku)
+                continue
+            orders.extend(self._order_row(snapshot, row, column) for column in columns)
+        return {'loaded_at': snapshot.loaded_at, 'lead_time': snapshot.lead_time,
+                'orders': orders, 'missing': missing}
+
+    # --- HTTP ---
+
+    async def dispatch(self, method, target):
+        """مسیر‌یابی یک درخواست؛ خروجی (کد وضعیت، بدنه JSON)."""
+        from urllib.parse import urlsplit, parse_qs
+
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == '/health':
+            return 200, self.health()
+        if url.path == '/reload':
+            if method != 'POST':
+                return 405, {'error': "use POST /reload"}
+            ok = await self.reload()
+            return (200 if ok else 503), self.health()
+        if url.path != '/orders':
+            return 404, {'error': f"unknown path {url.path}"}
+        if method != 'GET':
+            return 405, {'error': "use GET /orders"}
+        if self.snapshot is None:
+            return 503, self.health()
+        skus = [sku.strip() for value in query.get('sku', []) for sku in value.split(',') if sku.strip()]
+        platform = query.get('platform', [None])[-1]
+        try:
+            if skus:
+                return 200, self.query_skus(skus, platform)
+            if platform is not None:
+                return 200, self.query_platform(platform)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 400, {'error': "give sku (one or more) and/or platform"}
+
+    async def handle_connection(self, reader, writer):
+        """
+        یک درخواست HTTP/1.1 ساده (بدون keep-alive). خطای پیش‌بینی‌نشده در پاسخ دادن 500 می‌شود (و در لاگ
+        می‌آید) تا کلاینت بی‌جواب نماند؛ اتصال در هر حال بسته می‌شود.
+        """
+        try:
+            try:
+                request_line = (await reader.readline()).decode('latin-1').strip()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length:
+                    await reader.readexactly(length)
+                method, target, _ = request_line.split(' ', 2)
+            except (ValueError, asyncio.IncompleteReadError):
+                status, body = 400, {'error': "malformed request"}
+            else:
+                try:
+                    status, body = await self.dispatch(method.upper(), target)
+                except Exception as e:
+                    logger.exception("planning service: %s failed", request_line)
+                    status, body = 500, {'error': f"{type(e).__name__}: {e}"}
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, ready=None):
+        """محاسبه اولیه، شروع سرور و بررسی تغییر فایل تا زمان لغو؛ ready (asyncio.Event) بعد از شروع سرور set می‌شود."""
+        await self.reload()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        watcher = asyncio.create_task(self.watch())
+        # با port=0 پورت آزاد را سیستم‌عامل انتخاب می‌کند؛ آدرس واقعی در address است
+        self.address = server.sockets[0].getsockname()[:2]
+        print(f"planning service on http://{host}:{self.address[1]} (file: {self.settings['file']})")
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.close()
+
+
+def run_service(settings, host='127.0.0.1', port=8765, poll_interval=2.0, max_workers=1):
+    """اجرای سرویس تا Ctrl+C."""
+    service = PlanningService(settings, poll_interval, max_workers)
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,208 @@
+"""تنظیمات اجرا (فایل تنظیمات، manifest شعبه‌ها و خط فرمان) و برنامه پلتفرم‌ها."""
+import importlib.util
+import json
+
+from .engine import SAFETY_STOCK_MODES, SALES_TREND_DAYS, SKU_CHUNK_SIZE
+from .writers import OUTPUT_LAYOUTS, output_format
+
+
+# --- تنظیمات اجرا (فایل تنظیمات، manifest شعبه‌ها و خط فرمان) ---
+# کلیدهای تنظیمات در فایل تنظیمات، manifest شعبه‌ها و آرگومان‌های خط فرمان یکسان‌اند.
+
+ENGINES = ('batch', 'scalar')
+
+PLAN_DEFAULTS = {
+    'every_day': 'no',
+    'gaps': [],
+    'file': '1.xlsb',
+    'sheet_name': '1000',
+    'db_sheet': 'DB',
+    'output': 'suggested_orders_pandas.xlsx',
+    'engine': 'batch',
+    'cache': True,
+    'cache_dir': None,
+    'cache_hash': False,
+    'incremental': True,
+    'days': SALES_TREND_DAYS,
+    'projection': None,
+    'layout': 'single',
+    'safety_stock': 'sheet',
+    'service_level': 0.95,
+    'mc_samples': 1000,
+    'seed': 0,
+    'shadow': 0.0,
+    'shadow_max_skus': 1000,
+    'pipeline': False,
+    'sku_workers': 1,
+    'sku_chunk_size': SKU_CHUNK_SIZE,
+}
+
+PLAN_KEYS = ('order_horizon', 'platforms') + tuple(PLAN_DEFAULTS)
+
+
+def _strict_int(value):
+    """تبدیل به عدد صحیح بدون پذیرفتن مقدار اعشاری یا bool."""
+    if isinstance(value, bool):
+        raise ValueError
+    number = int(value)
+    if number != value and str(number) != str(value).strip():
+        raise ValueError
+    return number
+
+
+def validate_plan_settings(settings, extra_keys=()):
+    """
+    بررسی و یکسان‌سازی تنظیمات یک اجرا؛ همه مشکلات با هم در یک ValueError گزارش می‌شوند.
+    برای شعبه‌هایی که هر روز پلتفرم ندارند، تعداد gaps باید برابر تعداد پلتفرم‌ها باشد (مثل پرسش‌های main).
+    """
+    settings = {**PLAN_DEFAULTS, **settings}
+    errors = []
+
+    unknown = sorted(set(settings) - set(PLAN_KEYS) - set(extra_keys))
+    if unknown:
+        errors.append(f"unknown setting(s): {', '.join(unknown)}")
+    for key in ('order_horizon', 'platforms', 'days', 'mc_samples', 'shadow_max_skus', 'sku_workers',
+                'sku_chunk_size'):
+        if key not in settings:
+            errors.append(f"{key} is required")
+            continue
+        try:
+            settings[key] = _strict_int(settings[key])
+            if settings[key] <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(f"{key} must be a positive integer, got {settings[key]!r}")
+
+    every_day = str(settings['every_day']).strip().lower()
+    if every_day not in ('yes', 'no'):
+        errors.append(f"every_day must be 'yes' or 'no', got {settings['every_day']!r}")
+    settings['every_day'] = every_day
+
+    try:
+        gaps = [_strict_int(gap) for gap in settings['gaps']]
+        if any(gap < 0 for gap in gaps):
+            raise ValueError
+        settings['gaps'] = gaps
+        if every_day == 'no' and isinstance(settings.get('platforms'), int) and len(gaps) != settings['platforms']:
+            errors.append(f"gaps must list {settings['platforms']} value(s) (one per platform), got {len(gaps)}")
+    except (TypeError, ValueError):
+        errors.append(f"gaps must be a list of non-negative integers, got {settings['gaps']!r}")
+
+    if settings['engine'] not in ENGINES:
+        errors.append(f"engine must be one of {', '.join(ENGINES)}, got {settings['engine']!r}")
+    for key in ('file', 'sheet_name', 'db_sheet', 'output'):
+        if not isinstance(settings[key], str) or not settings[key]:
+            errors.append(f"{key} must be a non-empty string")
+    for key in ('cache', 'cache_hash', 'incremental', 'pipeline'):
+        if not isinstance(settings[key], bool):
+            errors.append(f"{key} must be true or false, got {settings[key]!r}")
+    if settings['safety_stock'] not in SAFETY_STOCK_MODES:
+        errors.append(f"safety_stock must be one of {', '.join(SAFETY_STOCK_MODES)}, got {settings['safety_stock']!r}")
+    try:
+        if isinstance(settings['service_level'], bool) or not 0 < float(settings['service_level']) < 1:
+            raise ValueError
+        settings['service_level'] = float(settings['service_level'])
+    except (TypeError, ValueError):
+        errors.append(f"service_level must be a number between 0 and 1, got {settings['service_level']!r}")
+    try:
+        settings['seed'] = _strict_int(settings['seed'])
+        if settings['seed'] < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append(f"seed must be a non-negative integer, got {settings['seed']!r}")
+    try:
+        if isinstance(settings['shadow'], bool) or not 0 <= float(settings['shadow']) <= 1:
+            raise ValueError
+        settings['shadow'] = float(settings['shadow'])
+    except (TypeError, ValueError):
+        errors.append(f"shadow must be a fraction between 0 and 1, got {settings['shadow']!r}")
+    if settings['layout'] not in OUTPUT_LAYOUTS:
+        errors.append(f"layout must be one of {', '.join(OUTPUT_LAYOUTS)}, got {settings['layout']!r}")
+    elif (settings['layout'] == 'per_platform' and isinstance(settings['output'], str)
+          and output_format(settings['output']) != 'xlsx'):
+        errors.append("layout 'per_platform' needs an .xlsx output")
+    if (isinstance(settings['output'], str) and output_format(settings['output']) == 'parquet'
+            and importlib.util.find_spec('pyarrow') is None):
+        errors.append("parquet output needs the optional pyarrow package (pip install pyarrow)")
+    for key in ('cache_dir', 'projection'):
+        if settings[key] is not None and not isinstance(settings[key], str):
+            errors.append(f"{key} must be a string")
+
+    if errors:
+        raise ValueError("; ".join(errors))
+    return settings
+
+
+def load_plan_config(path=None, **overrides):
+    """خواندن تنظیمات از فایل JSON (اختیاری) و اعمال مقادیر overrides (مقادیر None نادیده گرفته می‌شوند)."""
+    settings = _read_json(path) if path else {}
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return validate_plan_settings(settings)
+
+
+def plan_arguments(settings):
+    """تبدیل تنظیمات بررسی‌شده به آرگومان‌های run_plan."""
+    return {
+        'order_horizon_in_days': settings['order_horizon'],
+        'num_of_platforms': settings['platforms'],
+        'is_every_day_platform': settings['every_day'],
+        'platform_gaps': settings['gaps'],
+        'excel_file_name': settings['file'],
+        'sheet_name': settings['sheet_name'],
+        'sheet_name_data_base': settings['db_sheet'],
+        'output_file_name': settings['output'],
+        'engine': settings['engine'],
+        'use_cache': settings['cache'],
+        'cache_dir': settings['cache_dir'],
+        'cache_hash': settings['cache_hash'],
+        'incremental': settings['incremental'],
+        'num_of_days': settings['days'],
+        'projection_file_name': settings['projection'],
+        'output_layout': settings['layout'],
+        'safety_stock_mode': settings['safety_stock'],
+        'service_level': settings['service_level'],
+        'monte_carlo_samples': settings['mc_samples'],
+        'seed': settings['seed'],
+        'shadow_fraction': settings['shadow'],
+        'shadow_max_skus': settings['shadow_max_skus'],
+        'pipeline': settings['pipeline'],
+        'sku_workers': settings['sku_workers'],
+        'sku_chunk_size': settings['sku_chunk_size'],
+    }
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def platform_schedule(order_horizon_in_days, num_of_platforms, is_every_day_platform="no", platform_gaps=()):
+    """
+    بازه سفارش‌گذاری و فاصله تا پلتفرم بعدی برای هر پلتفرم: لیست (order_horizon, what_next_platform).
+    پلتفرم هر روزه: بازه هر پلتفرم یک روز بیشتر از قبلی است؛ در غیر این صورت بازه با فاصله‌های قبلی جمع می‌شود.
+    """
+    if is_every_day_platform not in ("yes", "no"):
+        raise ValueError(f"is_every_day_platform must be 'yes' or 'no', got {is_every_day_platform!r}")
+    if any(gap < 0 for gap in platform_gaps):
+        raise ValueError("platform gaps must not be negative")
+    if is_every_day_platform == "yes":
+        what_next_platform_list = [0] * (num_of_platforms + 1)
+    else:
+        what_next_platform_list = [0] + list(platform_gaps)
+
+    schedule = []
+    for platform_num in range(num_of_platforms):
+        # تنظیم order_horizon_in_days و what_next_platform بر اساس ورودی‌های کاربر
+        current_order_horizon = int(order_horizon_in_days)
+        # در کد اصلی، order_horizon_in_days در حلقه پلتفرم تغییر می‌کرد
+        if is_every_day_platform == "yes":
+            current_order_horizon += platform_num
+            what_next_platform = 0
+        else:
+            # what_next_platform_list[0] = 0 است.
+            # order_horizon = base_order + sum(previous gaps)
+            current_order_horizon += sum(what_next_platform_list[1:platform_num + 1])
+            # what_next_platform برای محاسبه بعدی استفاده می‌شود (gap بعدی)
+            what_next_platform = what_next_platform_list[platform_num + 1] if platform_num + 1 < len(what_next_platform_list) else 0
+        schedule.append((current_order_horizon, what_next_platform))
+    return schedule
@@ -0,0 +1,329 @@
+"""نوشتن سفارش‌ها (xlsx، CSV و Parquet) و موجودی پیش‌بینی‌شده."""
+import csv
+import os
+import itertools
+
+from .common import logger, pd
+from .engine import OrderTable, simulate_stock, sku_product_codes
+
+
+# --- نوشتن جریانی سفارش‌ها (xlsx، CSV و Parquet) ---
+# سفارش هر پلتفرم به محض نهایی شدن نوشته می‌شود و کل خروجی در حافظه جمع نمی‌شود.
+# نوشتن در یک فایل موقت کنار خروجی انجام می‌شود و فقط close (اجرای موفق) آن را جایگزین خروجی می‌کند؛
+# اگر اجرا وسط کار خطا بدهد (abort)، فایل موقت پاک می‌شود و خروجی اجرای قبلی دست نمی‌خورد.
+# قالب از پسوند فایل تعیین می‌شود: .csv، .parquet و بقیه xlsx.
+
+OUTPUT_LAYOUTS = ('single', 'per_platform')
+ORDER_HEADER = ["تاریخ", "کد محصول", "مقدار سفارش"]
+ORDER_COLUMNS = ('platform', 'date', 'product_code', 'quantity')
+
+
+def output_format(output_file_name):
+    """قالب خروجی از روی پسوند فایل: csv، parquet یا xlsx."""
+    extension = os.path.splitext(output_file_name)[1].lower()
+    return {'.csv': 'csv', '.parquet': 'parquet'}.get(extension, 'xlsx')
+
+
+class OrderWriter:
+    """
+    پایه نویسنده‌های جریانی سفارش؛ به صورت context manager استفاده می‌شود:
+    with open_order_writer(path) as writer: writer.write_platform('P1', orders)
+    orders همان لیست (تاریخ، کد محصول، مقدار) هر پلتفرم در main_order است.
+    """
+
+    def __init__(self, output_file_name, layout='single'):
+        self.output_file_name = output_file_name
+        self.layout = layout
+        self.rows_written = 0
+        self.temp_file_name = f"{output_file_name}.tmp"
+        self._finished = False
+
+    def write_platform(self, platform_name, orders):
+        """نوشتن لیست (تاریخ، کد محصول، مقدار) یک پلتفرم."""
+        self._write(platform_name, orders)
+        self.rows_written += len(orders)
+
+    def write_columns(self, platform_name, order_date, product_codes, quantities):
+        """نوشتن سفارش‌های یک پلتفرم از آرایه‌ها (مثل OrderTable.platform_columns) بدون ساختن تاپل‌ها."""
+        self._write(platform_name, zip(itertools.repeat(order_date), product_codes.tolist(), quantities.tolist()))
+        self.rows_written += len(quantities)
+
+    def _write(self, platform_name, orders):
+        raise NotImplementedError
+
+    def _finish(self):
+        """کامل کردن و بستن فایل موقت."""
+
+    def _discard(self):
+        """بستن فایل موقت بدون کامل کردن آن."""
+
+    def close(self):
+        """پایان اجرای موفق: فایل موقت کامل و جایگزین خروجی می‌شود."""
+        if self._finished:
+            return
+        self._finished = True
+        try:
+            self._finish()
+        except BaseException:
+            self._remove_temp_file()
+            raise
+        os.replace(self.temp_file_name, self.output_file_name)
+
+    def abort(self):
+        """
+        پایان اجرای ناموفق (وسط بازگشت یک خطا): فایل موقت پاک می‌شود و خروجی قبلی دست نمی‌خورد؛
+        هیچ خطای دیگری جای خطای اصلی را نمی‌گیرد.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        try:
+            self._discard()
+        except Exception as error:
+            logger.warning("could not close the partial output %s: %s", self.temp_file_name, error)
+        self._remove_temp_file()
+
+    def _remove_temp_file(self):
+        try:
+            os.remove(self.temp_file_name)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class _XlsxOrderWriter(OrderWriter):
+    """
+    xlsx با حافظه ثابت (openpyxl در حالت write_only). چیدمان single همان خروجی قبلی برنامه است:
+    یک شیت با عنوان پلتفرم، سرستون‌ها، ردیف‌ها و یک ردیف خالی؛ per_platform برای هر پلتفرم یک شیت با سرستون می‌سازد.
+    کتاب فقط در close ذخیره می‌شود؛ abort آن را بدون ذخیره کنار می‌گذارد.
+    """
+
+    def __init__(self, output_file_name, layout='single'):
+        super().__init__(output_file_name, layout)
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet('Sheet1') if layout == 'single' else None
+
+    def _write(self, platform_name, orders):
+        if self.layout == 'single':
+            sheet = self._sheet
+            sheet.append([platform_name])
+            sheet.append(ORDER_HEADER)
+        else:
+            sheet = self._workbook.create_sheet(platform_name)
+            sheet.append(ORDER_HEADER)
+        for order_date, code, qty in orders:
+            sheet.append([order_date, code, int(qty)])
+        if self.layout == 'single':
+            sheet.append([])  # فضای خالی
+
+    def _finish(self):
+        if not self._workbook.worksheets:
+            self._workbook.create_sheet('Sheet1')
+        self._workbook.save(self.temp_file_name)
+        self._workbook = None
+
+    def _discard(self):
+        # شیت‌های write_only یک فایل موقت باز دارند که باید بسته شود، حتی اگر کتاب ذخیره نشود
+        for sheet in self._workbook.worksheets:
+            sheet.close()
+        self._workbook = None
+
+
+class _CsvOrderWriter(OrderWriter):
+    """CSV بلند (platform، date، product_code، quantity) که بعد از هر پلتفرم روی دیسک flush می‌شود."""
+
+    def __init__(self, output_file_name, layout='single'):
+        super().__init__(output_file_name, layout)
+        self._file = open(self.temp_file_name, 'w', newline='', encoding='utf-8')
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(ORDER_COLUMNS)
+
+    def _write(self, platform_name, orders):
+        self._csv.writerows(
+            (platform_name, order_date.isoformat(), code, int(qty)) for order_date, code, qty in orders)
+        self._file.flush()
+
+    def _finish(self):
+        self._file.close()
+
+    _discard = _finish
+
+
+class _ParquetOrderWriter(OrderWriter):
+    """
+    Parquet با ستون‌های نوع‌دار (date32، کد محصول رشته‌ای، quantity از نوع int64)؛ هر پلتفرم یک row group است.
+    به pyarrow نیاز دارد که وابستگی اختیاری است.
+    """
+
+    def __init__(self, output_file_name, layout='single'):
+        super().__init__(output_file_name, layout)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output needs the optional pyarrow package (pip install pyarrow)") from e
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([
+            ('platform', pyarrow.string()),
+            ('date', pyarrow.date32()),
+            ('product_code', pyarrow.string()),
+            ('quantity', pyarrow.int64()),
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(self.temp_file_name, self._schema)
+
+    def _write(self, platform_name, orders):
+        orders = list(orders)
+        if orders:
+            dates, codes, quantities = zip(*orders)
+            self._write_table(platform_name, list(dates), codes, [int(qty) for qty in quantities])
+
+    def write_columns(self, platform_name, order_date, product_codes, quantities):
+        if len(quantities):
+            self._write_table(platform_name, [order_date] * len(quantities), product_codes, quantities)
+        self.rows_written += len(quantities)
+
+    def _write_table(self, platform_name, dates, codes, quantities):
+        self._writer.write_table(self._pa.table({
+            'platform': [platform_name] * len(dates),
+            'date': dates,
+            'product_code': [str(code) for code in codes],
+            'quantity': self._pa.array(quantities, type=self._pa.int64()),
+        }, schema=self._schema))
+
+    def _finish(self):
+        self._writer.close()
+
+    _discard = _finish
+
+
+_ORDER_WRITERS = {'xlsx': _XlsxOrderWriter, 'csv': _CsvOrderWriter, 'parquet': _ParquetOrderWriter}
+
+
+def open_order_writer(output_file_name, layout='single'):
+    """نویسنده جریانی مناسب پسوند فایل؛ چیدمان per_platform (شیت جدا برای هر پلتفرم) فقط برای xlsx است."""
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"layout must be one of {', '.join(OUTPUT_LAYOUTS)}, got {layout!r}")
+    fmt = output_format(output_file_name)
+    if layout == 'per_platform' and fmt != 'xlsx':
+        raise ValueError(f"layout 'per_platform' needs an .xlsx output, got {output_file_name!r}")
+    return _ORDER_WRITERS[fmt](output_file_name, layout)
+
+
+class BackgroundOrderWriter(OrderWriter):
+    """
+    نوشتن سفارش پلتفرم‌ها با writer (یک OrderWriter) در یک thread پس‌زمینه تا محاسبه پلتفرم‌های بعدی منتظر
+    نوشتن نماند. ترتیب پلتفرم‌ها حفظ می‌شود و حداکثر max_pending پلتفرم در صف می‌مانند؛ خطای نوشتن در
+    فراخوانی بعدی write_* یا در close برگردانده می‌شود و close (مثل OrderWriter) همیشه writer را می‌بندد.
+    abort (اجرای ناموفق) خطای نوشتن را فقط در لاگ می‌نویسد تا جای خطای اصلی اجرا را نگیرد.
+    """
+
+    def __init__(self, writer, max_pending=4):
+        import queue
+        import threading
+
+        self.writer = writer
+        self.output_file_name = writer.output_file_name
+        self.layout = writer.layout
+        self._error = None
+        self._pending = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._drain, name='order-writer', daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            if self._error is None:
+                method, args = item
+                try:
+                    getattr(self.writer, method)(*args)
+                except BaseException as error:
+                    self._error = error
+
+    def _submit(self, method, *args):
+        if self._error is not None:
+            raise self._error
+        self._pending.put((method, args))
+
+    def write_platform(self, platform_name, orders):
+        self._submit('write_platform', platform_name, list(orders))
+
+    def write_columns(self, platform_name, order_date, product_codes, quantities):
+        self._submit('write_columns', platform_name, order_date, product_codes, quantities)
+
+    @property
+    def rows_written(self):
+        return self.writer.rows_written
+
+    def _stop(self):
+        if self._thread.is_alive():
+            self._pending.put(None)
+            self._thread.join()
+
+    def close(self):
+        try:
+            self._stop()
+        except BaseException:
+            self.writer.abort()
+            raise
+        if self._error is not None:
+            self.writer.abort()
+            raise self._error
+        self.writer.close()
+
+    def abort(self):
+        try:
+            self._stop()
+        finally:
+            if self._error is not None:
+                logger.warning("background order writer failed too: %s: %s", type(self._error).__name__, self._error)
+            self.writer.abort()
+
+
+def write_suggested_orders(main_order, output_file_name, layout='single'):
+    """نوشتن سفارش‌های همه پلتفرم‌های main_order (با چیدمان قبلی برنامه در حالت پیش‌فرض)."""
+    with open_order_writer(output_file_name, layout) as writer:
+        for platform in main_order:
+            if isinstance(main_order, OrderTable):
+                writer.write_columns(platform, *main_order.platform_columns(platform))
+            else:
+                writer.write_platform(platform, main_order[platform])
+
+
+def project_floor_stock(sku_table, lead_time, quantities):
+    """
+    پیش‌بینی کف انبار روزانه هر محصول در کل روند (num_of_days روز) با بار در راه فایل و سفارش‌های برنامه:
+    مثل شبیه‌سازی داخل محاسبه، سفارش پلتفرم P{i-2} (ستون i-3 ماتریس quantities) در روز i می‌رسد.
+    """
+    num_of_days = sku_table.daily_sales.shape[1]
+    arrivals = {i: quantities[:, i - 3].astype(float) for i in range(num_of_days)
+                if i >= lead_time and i > 2 and i - 3 < quantities.shape[1]}
+    return simulate_stock(sku_table.records['initial_stock'], sku_table.daily_incoming,
+                          sku_table.daily_sales, num_of_days, arrivals, keep_trajectory=True)
+
+
+def write_stock_projection(sku_table, projection, output_file_name):
+    """نوشتن کف انبار پیش‌بینی‌شده (یک ستون برای هر روز) و روزهای کمبود هر محصول؛ پسوند .csv یعنی CSV و بقیه اکسل."""
+    days = projection.trajectory.shape[1]
+    output_df = pd.DataFrame(projection.trajectory, columns=[f"day_{day + 1}" for day in range(days)])
+    output_df.insert(0, 'product_code', sku_product_codes(sku_table))
+    output_df['stockout_days'] = projection.stockout_days
+    # اولین روز کمبود با شماره‌گذاری از 1 (خالی یعنی بدون کمبود)
+    output_df['first_stockout_day'] = pd.Series(projection.first_stockout_day + 1, dtype='Int64').mask(
+        projection.first_stockout_day < 0)
+    if output_file_name.lower().endswith('.csv'):
+        output_df.to_csv(output_file_name, index=False, encoding='utf-8')
+    else:
+        output_df.to_excel(output_file_name, index=False)
@@ -0,0 +1,26 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+
+NUM_SKUS = 40
+
+
+@pytest.fixture(scope='session')
+def workbook(tmp_path_factory):
+    """فایل xlsx مصنوعی کوچک (همان ساختار فایل واقعی) که بین تست‌ها مشترک است و تغییر داده نمی‌شود."""
+    path = tmp_path_factory.mktemp('workbook') / 'synthetic.xlsx'
+    return str(benchmark.write_synthetic_workbook(str(path), NUM_SKUS, seed=1))
+
+
+@pytest.fixture
+def book(tmp_path, workbook):
+    """نسخه‌ای از فایل مصنوعی که تست می‌تواند تغییرش دهد."""
+    path = tmp_path / 'book.xlsx'
+    shutil.copy(workbook, path)
+    return str(path)
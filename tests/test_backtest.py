@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import My_App
+from inv_control import backtest, planning, settings
+
+
+def _write_history(path, rows):
+    path.write_text("date,product_code,sales\n" + "".join(f"{row}\n" for row in rows), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def sku_table(workbook):
+    _, sku_table, _, _ = planning.load_plan_inputs(workbook, use_cache=False)
+    return sku_table
+
+
+def test_history_sales_land_on_their_day(tmp_path, sku_table):
+    path = _write_history(tmp_path / 'history.csv', ['2026-01-01,1000000,4', '2026-01-03,1000000,5',
+                                                     '2026-01-02, 1000001 ,7', '2026-01-01,999,1'])
+    history = backtest.load_sales_history(path, sku_table)
+    assert [str(day) for day in history.dates] == ['2026-01-01', '2026-01-02', '2026-01-03']
+    assert history.sales[0].tolist() == [4, 0, 5]
+    assert history.sales[1].tolist() == [0, 7, 0]
+    assert history.unmatched_codes == 1
+
+
+@pytest.mark.parametrize('bad_date', ['', 'not-a-date'])
+def test_history_rejects_blank_dates(tmp_path, sku_table, bad_date):
+    # قبلاً تاریخ خالی اندیس -1 می‌گرفت و فروشش به آخرین روز اضافه می‌شد
+    path = _write_history(tmp_path / 'history.csv', ['2026-01-01,1000000,4', f'{bad_date},1000000,9',
+                                                     '2026-01-02,1000000,5'])
+    with pytest.raises(ValueError, match=r"1 row\(s\) with a blank or invalid date \(line 3\)"):
+        backtest.load_sales_history(path, sku_table)
+
+
+def test_backtest_span_is_checked_before_reading_history(tmp_path, workbook, capsys):
+    missing_history = str(tmp_path / 'missing.csv')
+    code = My_App.cli(['backtest', missing_history, '--file', workbook, '--no-cache', '--horizon', '19',
+                       '--platforms', '1', '--every-day', 'yes'])
+    assert code == 2
+    assert "does not fit the 20-day sales trend" in capsys.readouterr().err
+
+
+def test_backtest_summary(tmp_path, workbook, sku_table):
+    days = [f'2026-01-{day:02d}' for day in range(1, 11)]
+    path = _write_history(tmp_path / 'history.csv',
+                          [f'{day},{1000000 + i},{i % 3}' for day in days for i in range(len(sku_table.records))])
+    plan_settings = settings.load_plan_config(order_horizon=2, platforms=1, every_day='yes', file=workbook, cache=False)
+    summary = backtest.run_backtest(plan_settings, path)
+    assert summary['days'] == 10 and summary['order_days'] == 10
+    result = backtest.backtest_policy(sku_table, 1, backtest.load_sales_history(path, sku_table), 2, 'yes')
+    trend = sku_table.records['is_trend']
+    assert summary['average_total_stock'] == round(float(result.average_stock[trend].sum()), 2)
+
+
+def test_calendar_gaps_count_as_days(tmp_path, sku_table):
+    # قبلاً تاریخ‌ها شماره‌گذاری می‌شدند و 01-05 روز بعد از 01-02 حساب می‌شد
+    path = _write_history(tmp_path / 'history.csv', ['2026-01-01,1000000,4', '2026-01-02,1000000,2',
+                                                     '2026-01-05,1000000,6'])
+    history = backtest.load_sales_history(path, sku_table)
+    assert [str(day) for day in history.dates] == ['2026-01-01', '2026-01-02', '2026-01-03', '2026-01-04',
+                                                   '2026-01-05']
+    assert history.sales[0].tolist() == [4, 2, 0, 0, 6]
+    assert history.missing_days == 2
+
+
+def test_dated_inventory_and_incoming(tmp_path, sku_table):
+    path = tmp_path / 'history.csv'
+    path.write_text("date,product_code,sales,inventory,incoming\n"
+                    "2026-01-01,1000000,0,50,\n"
+                    "2026-01-02,1000000,0,,30\n"
+                    "2026-01-03,1000000,0,45,5\n", encoding='utf-8')
+    history = backtest.load_sales_history(str(path), sku_table)
+    assert history.start_inventory[0] == 50
+    assert history.start_inventory[1] == sku_table.records['initial_stock'][1]
+    assert history.incoming[0].tolist() == [0, 30, 5]
+    assert history.later_inventory == 1
+    # محصول غیرروندی سفارش نمی‌گیرد: موجودی پایان = موجودی روز اول + بار در راه تاریخ‌دار (نه بار در راه شیت)
+    history = history._replace(start_inventory=np.zeros(len(sku_table.records)),
+                               incoming=np.zeros_like(history.incoming))
+    history.incoming[:, 1] = 7
+    result = backtest.backtest_policy(sku_table, 1, history, 1, 'yes')
+    quiet = ~sku_table.records['is_trend']
+    assert quiet.any()
+    assert result.end_stock[quiet].tolist() == [7.0] * int(quiet.sum())
@@ -0,0 +1,76 @@
+import json
+import shutil
+
+import pytest
+
+from inv_control import branches, planning, settings
+
+
+def _expected_platforms(workbook, num_of_platforms):
+    """خلاصه سفارش هر پلتفرم (تعداد محصول و جمع مقدار) با اجرای مستقیم همان تنظیمات."""
+    lead_time, sku_table, prefix_sums, _ = planning.load_plan_inputs(workbook, use_cache=False)
+    schedule = settings.platform_schedule(2, num_of_platforms, 'yes', ())
+    _, quantities = planning.plan_orders(sku_table, lead_time, schedule, 'yes', prefix_sums=prefix_sums,
+                                         verbose=False)
+    return {f'P{i + 1}': {'skus': int((quantities[:, i] > 0).sum()), 'units': int(quantities[:, i].sum())}
+            for i in range(num_of_platforms)}
+
+
+def _write_json(path, value):
+    path.write_text(json.dumps(value), encoding='utf-8')
+
+
+@pytest.fixture
+def branch_dir(tmp_path, workbook):
+    """پوشه شعبه‌ها: دو شعبه سالم با تعداد پلتفرم متفاوت، یک فایل خراب و یک پوشه بدون فایل اکسل."""
+    source = tmp_path / 'branches'
+    for name, branch_settings in (('north', {'platforms': 2}), ('south', {'platforms': 3, 'output': 'south.csv'})):
+        (source / name).mkdir(parents=True)
+        shutil.copy(workbook, source / name / '1.xlsx')
+        _write_json(source / name / 'settings.json', branch_settings)
+    (source / 'broken').mkdir()
+    (source / 'broken' / '1.xlsx').write_bytes(b'not a workbook')
+    (source / 'notes').mkdir()
+    (source / 'notes' / 'readme.txt').write_text('no workbook here', encoding='utf-8')
+    _write_json(source / 'defaults.json', {'order_horizon': 2, 'platforms': 1, 'every_day': 'yes', 'cache': False})
+    return source
+
+
+def test_directory_branches_run_and_are_summarized(tmp_path, workbook, branch_dir):
+    output_dir = tmp_path / 'out'
+    summary = branches.run_branches(str(branch_dir), str(output_dir))
+    assert [result['name'] for result in summary['branches']] == ['broken', 'north', 'south']
+    assert (summary['succeeded'], summary['failed']) == (2, 1)
+
+    broken, north, south = summary['branches']
+    assert broken['status'] == 'failed' and broken['error']
+    assert north['status'] == south['status'] == 'ok'
+    assert north['platforms'] == _expected_platforms(workbook, 2)
+    assert south['platforms'] == _expected_platforms(workbook, 3)
+    assert north['output'] == str(output_dir / 'north_suggested_orders.xlsx')
+    assert south['output'] == str(output_dir / 'south.csv')
+    for result in summary['branches']:
+        assert (output_dir / f"{result['name']}.log").exists()
+    assert (output_dir / 'north_suggested_orders.xlsx').exists() and (output_dir / 'south.csv').exists()
+    with open(output_dir / 'branches_summary.json', encoding='utf-8') as f:
+        assert json.load(f) == summary
+
+
+def test_manifest_defaults_and_relative_files(tmp_path):
+    manifest = tmp_path / 'branches.json'
+    _write_json(manifest, {'defaults': {'order_horizon': 3, 'platforms': 2},
+                           'branches': [{'file': 'a/1.xlsb'}, {'name': 'b', 'file': 'b.xlsx', 'platforms': 4}]})
+    loaded = branches.load_branch_manifest(str(manifest))
+    assert [(branch['name'], branch['file'], branch['order_horizon'], branch['platforms']) for branch in loaded] == [
+        ('1', str(tmp_path / 'a' / '1.xlsb'), 3, 2), ('b', str(tmp_path / 'b.xlsx'), 3, 4)]
+
+
+@pytest.mark.parametrize('entries, message', [
+    ([{'name': 'a', 'file': 'a.xlsx'}, {'name': 'a', 'file': 'b.xlsx'}], "duplicate branch name 'a'"),
+    ([{'name': 'a'}], "branch 'a' has no workbook file"),
+])
+def test_manifest_errors(tmp_path, entries, message):
+    manifest = tmp_path / 'branches.json'
+    _write_json(manifest, {'branches': entries})
+    with pytest.raises(ValueError, match=message):
+        branches.load_branch_manifest(str(manifest))
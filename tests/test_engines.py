@@ -0,0 +1,182 @@
+import math
+
+import numpy as np
+import pytest
+
+from inv_control import engine, engine_check, planning, settings
+
+NUM_OF_DAYS = 10
+
+
+def _sku_inputs(**overrides):
+    """ورودی یک محصول روندی که با موجودی صفر حتماً سفارش می‌گیرد."""
+    sku = {
+        'product_code': 'A1', 'initial_stock': 0.0, 'lead_time': 1, 'order_horizon': 2, 'avg_daily_sales': 5.0,
+        'daily_sales': [5.0] * NUM_OF_DAYS, 'daily_incoming': [0.0] * NUM_OF_DAYS, 'safety_stock': 1.0,
+        'box_size': 6.0, 'pallet_size': 120.0, 'row_size': 24.0, 'shelf_life': 90.0, 'F_O_S': engine.FOS_TREND,
+        'platform_num_range': 0, 'num_of_platforms': 1, 'order_list': {}, 'what_next_platform': 1,
+        'is_every_day': 'no',
+    }
+    sku.update(overrides)
+    return sku
+
+
+def _run_both(skus):
+    """مقدار سفارش یا خطای هر دو موتور برای لیستی از محصولات."""
+    def outcome(func):
+        try:
+            return func()
+        except Exception as error:
+            return type(error)
+
+    scalar = outcome(lambda: [engine.calculate_order_quantity(**sku) for sku in skus])
+    first = skus[0]
+    batch = outcome(lambda: engine.calculate_order_quantity_batch(
+        product_codes=[sku['product_code'] for sku in skus],
+        initial_stock=[sku['initial_stock'] for sku in skus],
+        lead_time=first['lead_time'], order_horizon=first['order_horizon'],
+        avg_daily_sales=[sku['avg_daily_sales'] for sku in skus],
+        daily_sales=[sku['daily_sales'] for sku in skus],
+        daily_incoming=[sku['daily_incoming'] for sku in skus],
+        safety_stock=[sku['safety_stock'] for sku in skus],
+        box_size=[sku['box_size'] for sku in skus],
+        pallet_size=[sku['pallet_size'] for sku in skus],
+        row_size=[sku['row_size'] for sku in skus],
+        shelf_life=[sku['shelf_life'] for sku in skus],
+        F_O_S=[sku['F_O_S'] for sku in skus],
+        platform_num_range=0, num_of_platforms=1, order_list={}, what_next_platform=first['what_next_platform'],
+        is_every_day=first['is_every_day']).tolist())
+    return scalar, batch
+
+
+def test_engines_agree_on_a_plain_sku():
+    scalar, batch = _run_both([_sku_inputs(), _sku_inputs(product_code='B2', F_O_S='ثابت')])
+    assert scalar == batch
+    assert batch[0] > 0 and batch[1] == 0
+
+
+
+def test_engines_agree_on_fractional_sales_windows():
+    # بازه روزهای اضافه (از end_of_horizon) قبلاً با تفاضل جمع تجمعی حساب می‌شد و اینجا 24 به جای 23 می‌داد
+    sales = [2.8, 2.9, 1.7, 4.2, 0.6, 0.3, 3.3, 9.9, 7.3, 4.3, 2.0, 1.2]
+    sku = _sku_inputs(daily_sales=sales, daily_incoming=[0.0] * len(sales), initial_stock=8.3,
+                      avg_daily_sales=1.0, safety_stock=8.0, box_size=1.0, row_size=0.0, shelf_life=30.0,
+                      what_next_platform=5)
+    scalar, batch = _run_both([sku])
+    assert scalar == batch == [23]
+
+
+@pytest.mark.parametrize('is_every_day, what_next_platform', [('no', 1), ('no', 3), ('no', 5), ('yes', 1)])
+def test_engines_agree_on_random_fractional_skus(is_every_day, what_next_platform):
+    rng = np.random.default_rng(7)
+    num_of_days = 14
+    skus = [_sku_inputs(
+        product_code=f'C{i}',
+        daily_sales=np.round(rng.uniform(0, 10, num_of_days), 1).tolist(),
+        daily_incoming=np.round(rng.uniform(0, 30, num_of_days) * (rng.random(num_of_days) < 0.2), 1).tolist(),
+        initial_stock=round(rng.uniform(0, 40), 1), avg_daily_sales=round(rng.uniform(0, 10), 1),
+        safety_stock=float(rng.integers(0, 8)), box_size=float(rng.choice([1, 6, 12])),
+        row_size=float(rng.choice([0, 24, 48])), pallet_size=float(rng.choice([60, 120, 240])),
+        shelf_life=float(rng.choice([20, 30, 45, 75, 120])), what_next_platform=what_next_platform,
+        is_every_day=is_every_day) for i in range(2000)]
+    scalar, batch = _run_both(skus)
+    assert scalar == batch
+
+
+@pytest.mark.parametrize('overrides, error', [
+    ({'safety_stock': math.nan}, ValueError),
+    ({'safety_stock': math.inf}, OverflowError),
+    ({'pallet_size': 0.0}, ZeroDivisionError),
+])
+def test_non_finite_orders_raise_like_the_reference(overrides, error):
+    # قبلاً موتور دسته‌ای برای این محصولات بی‌صدا سفارش صفر می‌داد
+    scalar, batch = _run_both([_sku_inputs(product_code='OK'), _sku_inputs(**overrides)])
+    assert scalar is error
+    assert batch is error
+
+
+def test_non_finite_inputs_of_non_trend_skus_are_ignored():
+    scalar, batch = _run_both([_sku_inputs(), _sku_inputs(F_O_S=None, safety_stock=math.nan)])
+    assert scalar == batch
+    assert batch[1] == 0
+
+
+def test_batch_error_names_the_product():
+    with pytest.raises(ValueError, match="product code 'BAD'"):
+        skus = [_sku_inputs(), _sku_inputs(product_code='BAD', safety_stock=np.nan)]
+        engine.calculate_order_quantity_batch(
+            [sku['product_code'] for sku in skus], [0.0, 0.0], 1, 2, [5.0, 5.0],
+            [sku['daily_sales'] for sku in skus], [sku['daily_incoming'] for sku in skus], [1.0, np.nan],
+            [6.0, 6.0], [120.0, 120.0], [24.0, 24.0], [90.0, 90.0], [engine.FOS_TREND] * 2, 0, 1, {}, 1, 'no')
+
+
+@pytest.fixture(scope='module')
+def plan_inputs(workbook):
+    return planning.load_plan_inputs(workbook, use_cache=False)
+
+
+@pytest.mark.parametrize('order_horizon, num_of_platforms, every_day, gaps', [
+    (2, 3, 'yes', ()),
+    (1, 4, 'no', (1, 2, 1, 3)),
+    (3, 2, 'no', (2, 5)),
+])
+def test_engines_agree_on_the_workbook(plan_inputs, order_horizon, num_of_platforms, every_day, gaps):
+    lead_time, sku_table, prefix_sums, _ = plan_inputs
+    schedule = settings.platform_schedule(order_horizon, num_of_platforms, every_day, gaps)
+    _, batch = planning.plan_orders(sku_table, lead_time, schedule, every_day, 'batch', prefix_sums, verbose=False)
+    _, scalar = planning.plan_orders(sku_table, lead_time, schedule, every_day, 'scalar', prefix_sums, verbose=False)
+    np.testing.assert_array_equal(batch, scalar)
+    assert batch.any()
+    assert engine_check.compare_engines(sku_table, lead_time, schedule, every_day) == []
+
+
+def test_scalar_chunks_match_a_single_pass(plan_inputs):
+    lead_time, sku_table, prefix_sums, _ = plan_inputs
+    schedule = settings.platform_schedule(2, 3, 'yes', ())
+    _, single = planning.plan_orders(sku_table, lead_time, schedule, 'yes', 'scalar', prefix_sums, verbose=False)
+    _, chunked = planning.plan_orders(sku_table, lead_time, schedule, 'yes', 'scalar', prefix_sums, verbose=False,
+                                      workers=2, chunk_size=7)
+    np.testing.assert_array_equal(chunked, single)
+
+
+PACK_ROUNDING_CASES = [
+    # (مقدار، باکس، ردیف، پالت، میانگین فروش، ماندگاری) -> مقدار گرد شده
+    ((9, 6, 0, 120, 5, 90), 12),          # نیم باکس به زوج: 1.5 -> 2
+    ((15, 6, 0, 120, 5, 90), 12),         # 2.5 -> 2
+    ((21, 6, 0, 120, 5, 90), 24),         # 3.5 -> 4
+    ((7.4, 0, 0, 120, 5, 90), 7.4),       # باکس صفر رد می‌شود
+    ((11.4, 1, 24, 120, 5, 90), 11),      # کمتر از نیم ردیف
+    ((11.9, 1, 24, 120, 5, 90), 24),      # نیم ردیف به بالا
+    ((31.2, 1, 24, 120, 5, 90), 24),      # باقیمانده ردیف 0.29 < 0.3
+    ((31.5, 1, 24, 120, 5, 90), 48),      # باقیمانده ردیف 0.33 >= 0.3
+    ((300, 1, 20, 120, 84, 90), 240),     # میانگین فروش = 0.7 پالت: گرد کردن پالت به زوج
+    ((300, 1, 20, 120, 83.9, 90), 360),   # زیر 0.7 پالت: نیم پالت ROUND_HALF_UP
+    ((71, 1, 0, 120, 5, 90), 71),         # باقیمانده پالت 0.59
+    ((72, 1, 0, 120, 5, 90), 120),        # باقیمانده پالت 0.6
+    ((60, 1, 20, 120, 5, 90), 60),        # نیم پالت، ماندگاری <= 95 و کمتر از پالت: گرد کردن ردیف
+    ((60, 1, 20, 120, 5, 96), 120),       # ماندگاری > 95: ROUND_HALF_UP پالت
+    ((130, 1, 0, 120, 5, 90), 120),       # کمتر از نیم پالت و بیشتر از یک پالت
+    ((240, 1, 0, 120, 5, 90), 240),       # مضرب پالت
+]
+
+
+@pytest.mark.parametrize('case, expected', PACK_ROUNDING_CASES)
+def test_pack_rounding_boundaries(case, expected):
+    quantity, box_size, row_size, pallet_size, avg_daily_sales, shelf_life = case
+    assert engine.apply_pack_rounding(quantity, box_size, pallet_size, row_size, avg_daily_sales,
+                                      shelf_life) == expected
+    # با موجودی و موجودی اطمینانی صفر، مقدار سفارش همان فروش روز پایان بازه (lead_time + order_horizon) است
+    daily_sales = [0.0] * NUM_OF_DAYS
+    daily_sales[3] = float(quantity)
+    sku = _sku_inputs(daily_sales=daily_sales, safety_stock=0.0, box_size=float(box_size), row_size=float(row_size),
+                      pallet_size=float(pallet_size), avg_daily_sales=float(avg_daily_sales),
+                      shelf_life=float(shelf_life))
+    assert _run_both([sku]) == ([int(expected)], [int(expected)])
+
+
+def test_pack_rounding_on_arrays_matches_each_case():
+    cases, expected = zip(*PACK_ROUNDING_CASES)
+    quantity, box_size, row_size, pallet_size, avg_daily_sales, shelf_life = (
+        np.array(column) for column in zip(*cases))
+    rounded = engine.apply_pack_rounding(quantity, box_size, pallet_size, row_size, avg_daily_sales, shelf_life)
+    assert rounded.tolist() == list(expected)
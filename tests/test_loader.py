@@ -0,0 +1,100 @@
+import math
+
+import pandas as pd
+import pytest
+
+from inv_control import common, loader
+
+
+@pytest.mark.parametrize('letters, index', [
+    ('A', 0), ('Z', 25), ('AA', 26), ('AZ', 51), ('BA', 52), ('ZZ', 701), ('AAA', 702), ('XFD', 16383),
+    ('aa', 26),
+])
+def test_column_index_past_single_letters(letters, index):
+    assert loader.column_index(letters) == index
+
+
+def test_column_letters_round_trip():
+    for index in range(loader.EXCEL_MAX_COLUMNS):
+        assert loader.column_index(loader.column_letters(index)) == index
+
+
+@pytest.mark.parametrize('letters', ['XFE', 'ZZZ', '', 'A1', 'ب', None])
+def test_column_index_rejects_invalid_letters(letters):
+    with pytest.raises(ValueError):
+        loader.column_index(letters)
+
+
+@pytest.mark.parametrize('index', [-1, loader.EXCEL_MAX_COLUMNS])
+def test_column_letters_rejects_out_of_range(index):
+    with pytest.raises(ValueError):
+        loader.column_letters(index)
+
+
+@pytest.mark.parametrize('excel_ref, position', [
+    ('A1', (0, 0)), ('AB8', (7, 27)), ('$AZ$12', (11, 51)), (' BA3 ', (2, 52)), ('XFD1048576', (1048575, 16383)),
+])
+def test_parse_a1(excel_ref, position):
+    assert loader.parse_a1(excel_ref) == position
+    assert loader.format_a1(*position) == excel_ref.strip().replace('$', '')
+
+
+@pytest.mark.parametrize('excel_ref', ['', 'A0', 'A1048577', '1A', 'AAAA1', 'XFE1', 'A1:B2', 12, None])
+def test_parse_a1_rejects_invalid_references(excel_ref):
+    with pytest.raises(ValueError):
+        loader.parse_a1(excel_ref)
+
+
+def _linear_vlookup(df, lookup_value, exact_match):
+    """جستجوی خطی قبلی vlookup_in_python_pandas (ستون A، نتیجه ستون B) به عنوان مرجع."""
+    lookup_series, result_series = df.iloc[:, 0].tolist(), df.iloc[:, 1].tolist()
+    if exact_match:
+        return next((result_series[i] for i, value in enumerate(lookup_series) if value == lookup_value), None)
+    best_match_idx, min_difference = None, float('inf')
+    for i, value in enumerate(lookup_series):
+        if value is None:
+            continue
+        try:
+            difference = abs(float(value) - lookup_value)
+            if difference < min_difference:
+                min_difference, best_match_idx = difference, i
+        except (ValueError, TypeError):
+            continue
+    return None if best_match_idx is None else result_series[best_match_idx]
+
+
+@pytest.fixture
+def lookup_sheet():
+    # مقادیر تکراری (5 و 12)، متن، متن عددی، None و NaN در ستون جستجو
+    keys = [5, 'x', None, math.nan, 12, 5, '7', 9.5, 12]
+    return pd.DataFrame({0: keys, 1: [f'r{i}' for i in range(len(keys))]}, dtype=object)
+
+
+@pytest.mark.parametrize('lookup_value, expected', [
+    (5, 'r0'), (12, 'r4'), (5.0, 'r0'), ('x', 'r1'), ('7', 'r6'), (None, 'r2'), (7, None), (99, None),
+    (math.nan, None),
+])
+def test_exact_lookup_matches_the_linear_scan(lookup_sheet, lookup_value, expected):
+    assert loader.vlookup_in_python_pandas(lookup_sheet, lookup_value, 'A', 'B', exact_match=True) == expected
+    assert _linear_vlookup(lookup_sheet, lookup_value, True) == expected
+
+
+@pytest.mark.parametrize('lookup_value, expected', [
+    (6, 'r0'),       # فاصله برابر تا 5 و '7': ردیف بالاتر
+    (8.75, 'r7'), (12, 'r4'), (100, 'r4'), (-3, 'r0'), (7, 'r6'), ('12', None), (math.inf, None),
+])
+def test_nearest_lookup_matches_the_linear_scan(lookup_sheet, lookup_value, expected):
+    assert loader.vlookup_in_python_pandas(lookup_sheet, lookup_value, 'A', 'B') == expected
+    assert _linear_vlookup(lookup_sheet, lookup_value, False) == expected
+
+
+def test_lookup_index_is_built_once_per_sheet(lookup_sheet):
+    common.instruments.reset()
+    for value in (5, 12, 99):
+        loader.vlookup_in_python_pandas(lookup_sheet, value, 'A', 'B', exact_match=True)
+    assert common.instruments.counters['lookup_index_builds'] == 1
+    assert common.instruments.counters['lookup_index_hits'] == 2
+    # شیت با ابعاد جدید ایندکس تازه می‌گیرد
+    lookup_sheet.loc[len(lookup_sheet)] = [99, 'r9']
+    assert loader.vlookup_in_python_pandas(lookup_sheet, 99, 'A', 'B', exact_match=True) == 'r9'
+    assert common.instruments.counters['lookup_index_builds'] == 2
@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import benchmark
+from inv_control import common, planning
+
+
+def _run(book, tmp_path, output, **kwargs):
+    """اجرای برنامه با کش جدا برای هر تست؛ خروجی CSV به صورت DataFrame."""
+    path = str(tmp_path / output)
+    planning.run_plan(2, 3, 'no', (1, 2, 1), excel_file_name=book, output_file_name=path,
+                      cache_dir=str(tmp_path / 'cache'), **kwargs)
+    return pd.read_csv(path)
+
+
+def _edit_sku(book, i, column, value):
+    """تغییر یک سلول محصول iام و جلو بردن زمان تغییر فایل (کلید کش)."""
+    stat = os.stat(book)
+    workbook = load_workbook(book)
+    workbook['1000'][f'{column}{benchmark.FIRST_SKU_ROW + i * 9}'] = value
+    workbook.save(book)
+    os.utime(book, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_workbook_reuses_every_sku(book, tmp_path, capsys):
+    first = _run(book, tmp_path, 'first.csv')
+    second = _run(book, tmp_path, 'second.csv')
+    pd.testing.assert_frame_equal(second, first)
+    assert common.instruments.counters['skus_recomputed'] == 0
+    assert common.instruments.counters['skus_reused'] == len(planning.load_plan_inputs(book, use_cache=False)[1].records)
+
+
+@pytest.mark.parametrize('column, value', [
+    ('C', 0),      # موجودی
+    ('J', 500),    # فروش روز اول
+    ('H', 'ثابت'),  # FOS
+])
+def test_incremental_run_matches_a_full_run(book, tmp_path, capsys, column, value):
+    # محصول 22 فایل مصنوعی در برنامه سفارش دارد و هر سه تغییر سفارش آن را عوض می‌کنند
+    before = _run(book, tmp_path, 'before.csv')
+    _edit_sku(book, 22, column, value)
+    incremental = _run(book, tmp_path, 'incremental.csv')
+    assert common.instruments.counters['skus_recomputed'] == 1
+    full = _run(book, tmp_path, 'full.csv', incremental=False)
+    assert 'skus_recomputed' not in common.instruments.counters
+    pd.testing.assert_frame_equal(incremental, full)
+    assert not incremental.equals(before)
+
+
+def test_settings_change_recomputes_everything(book, tmp_path, capsys):
+    _run(book, tmp_path, 'before.csv')
+    _run(book, tmp_path, 'scalar.csv', engine='scalar')
+    assert common.instruments.counters['skus_reused'] == 0
@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import pytest
+
+from inv_control import engine
+
+RISK_DAYS = 10
+SAMPLES = 20_000
+
+
+def _exact_safety_stock(low, high, risk_days, service_level):
+    """
+    موجودی اطمینان دقیق روندی که نیمی از روزهایش فروش low و نیمی high دارد: تعداد روزهای high در دوره ریسک
+    توزیع دوجمله‌ای (risk_days، 1/2) دارد و چندک سطح خدمت آن منهای فروش مورد انتظار جواب است.
+    """
+    cumulative = 0.0
+    for high_days in range(risk_days + 1):
+        cumulative += math.comb(risk_days, high_days) / 2 ** risk_days
+        if cumulative >= service_level:
+            break
+    demand = high_days * high + (risk_days - high_days) * low
+    return demand - (low + high) / 2 * risk_days
+
+
+@pytest.fixture
+def daily_sales():
+    # محصول دوم فروش ثابت دارد و موجودی اطمینان نمی‌خواهد
+    return np.array([[0.0, 10.0] * 10, [5.0] * 20])
+
+
+def test_same_seed_gives_the_same_safety_stock(daily_sales, monkeypatch):
+    first = engine.monte_carlo_safety_stock(daily_sales, RISK_DAYS, 0.95, SAMPLES, seed=3)
+    assert engine.monte_carlo_safety_stock(daily_sales, RISK_DAYS, 0.95, SAMPLES, seed=3).tolist() == first.tolist()
+    # اندازه تکه‌ها نتیجه را عوض نمی‌کند
+    monkeypatch.setattr(engine, 'MONTE_CARLO_CHUNK_CELLS', 1)
+    assert engine.monte_carlo_safety_stock(daily_sales, RISK_DAYS, 0.95, SAMPLES, seed=3).tolist() == first.tolist()
+
+
+@pytest.mark.parametrize('service_level', [0.5, 0.9, 0.95, 0.995])
+def test_safety_stock_covers_the_exact_quantile(daily_sales, service_level):
+    exact = _exact_safety_stock(0.0, 10.0, RISK_DAYS, service_level)
+    safety_units = engine.monte_carlo_safety_stock(daily_sales, RISK_DAYS, service_level, SAMPLES, seed=3)
+    assert safety_units[0] >= exact
+    # چندک دوجمله‌ای از مرزهای سطح خدمت دور است، پس با این تعداد نمونه دقیقاً همان مقدار به دست می‌آید
+    assert safety_units[0] == exact
+    assert safety_units[1] == 0
+
+
+def test_plan_safety_stock_converts_units_to_days(daily_sales):
+    records = np.zeros(2, dtype=[('avg_daily_sales', 'f8'), ('safety_stock', 'f8')])
+    records['avg_daily_sales'] = daily_sales.mean(axis=1)
+    records['safety_stock'] = 2.0
+    sku_table = engine.SkuTable(records, None, daily_sales, np.zeros_like(daily_sales))
+    planned = engine.plan_safety_stock(sku_table, 4, 6, 'monte_carlo', 0.95, SAMPLES, seed=3)
+    assert planned.records['safety_stock'].tolist() == [_exact_safety_stock(0.0, 10.0, RISK_DAYS, 0.95) / 5, 0.0]
+    assert engine.plan_safety_stock(sku_table, 4, 6, 'sheet') is sku_table
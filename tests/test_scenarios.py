@@ -0,0 +1,76 @@
+import pytest
+
+from inv_control import engine, planning, scenarios, settings
+
+
+@pytest.fixture
+def base(workbook):
+    return {'file': workbook, 'order_horizon': 2, 'platforms': 3, 'every_day': 'yes', 'cache': False}
+
+
+def _direct_row(workbook, lead_time=None, safety_stock_days=None):
+    """خلاصه سفارش با اجرای مستقیم plan_orders (بدون مسیر سناریو)."""
+    sheet_lead_time, sku_table, prefix_sums, _ = planning.load_plan_inputs(workbook, use_cache=False)
+    if safety_stock_days is not None:
+        sku_table = engine.with_safety_stock_days(sku_table, safety_stock_days)
+    schedule = settings.platform_schedule(2, 3, 'yes', ())
+    _, quantities = planning.plan_orders(sku_table, sheet_lead_time if lead_time is None else lead_time, schedule,
+                                         'yes', prefix_sums=prefix_sums, verbose=False)
+    return {
+        'units': int(quantities.sum()),
+        'pallets': round(float((quantities / sku_table.records['pallet_size'][:, None]).sum()), 2),
+        'skus': int((quantities > 0).any(axis=1).sum()),
+        'order_lines': int((quantities > 0).sum()),
+    }
+
+
+def _totals(row):
+    return {key: row[key] for key in ('units', 'pallets', 'skus', 'order_lines')}
+
+
+def test_overrides_match_a_direct_run(workbook, base):
+    rows = scenarios.run_scenarios({'base': base, 'scenarios': [
+        {'name': 'base'},
+        {'name': 'slow supplier', 'lead_time': 3},
+        {'name': 'lean', 'safety_stock_days': 0},
+    ]})
+    assert [row['name'] for row in rows] == ['base', 'slow supplier', 'lean']
+    by_name = {row['name']: row for row in rows}
+    assert _totals(by_name['base']) == _direct_row(workbook)
+    assert by_name['base']['lead_time'] == planning.load_plan_inputs(workbook, use_cache=False)[0]
+    assert _totals(by_name['slow supplier']) == _direct_row(workbook, lead_time=3)
+    assert _totals(by_name['lean']) == _direct_row(workbook, safety_stock_days=0.0)
+    # هر تغییر نتیجه را نسبت به برنامه پایه عوض می‌کند
+    assert by_name['slow supplier']['units'] > by_name['base']['units'] > by_name['lean']['units']
+
+
+def test_failed_scenario_does_not_stop_the_others(base):
+    rows = scenarios.run_scenarios({'base': base, 'scenarios': [{'lead_time': 30}, {'lead_time': 1}]})
+    assert rows[0]['name'] == 'lead_time=30' and rows[0]['error'].startswith('IndexError')
+    assert 'error' not in rows[1] and rows[1]['units'] > 0
+
+
+def test_grid_expands_every_combination():
+    base, expanded = scenarios.expand_scenarios({
+        'base': {'platforms': 2},
+        'grid': {'lead_time': [1, 2], 'gaps': [[1, 1], [2, 3]]},
+        'scenarios': [{'name': 'explicit', 'every_day': 'yes'}],
+    })
+    assert base == {'platforms': 2}
+    assert [scenario['name'] for scenario in expanded] == [
+        'explicit', 'lead_time=1, gaps=1-1', 'lead_time=1, gaps=2-3', 'lead_time=2, gaps=1-1',
+        'lead_time=2, gaps=2-3']
+
+
+@pytest.mark.parametrize('spec, message', [
+    ([{'lead_time': 1, 'horizon': 2}], "unknown scenario setting"),
+    ([{'name': 'a'}, {'name': 'a', 'lead_time': 2}], "duplicate scenario name 'a'"),
+])
+def test_invalid_scenarios(spec, message):
+    with pytest.raises(ValueError, match=message):
+        scenarios.expand_scenarios(spec)
+
+
+def test_invalid_override_names_the_scenario(base):
+    with pytest.raises(ValueError, match="scenario 'bad': lead_time must be a non-negative integer"):
+        scenarios.run_scenarios({'base': base, 'scenarios': [{'name': 'bad', 'lead_time': -1}]})
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from inv_control import planning, service, settings
+
+NUM_OF_PLATFORMS = 3
+
+
+@pytest.fixture
+def plan_settings(workbook):
+    return settings.load_plan_config(order_horizon=2, platforms=NUM_OF_PLATFORMS, every_day='yes', file=workbook,
+                                     cache=False)
+
+
+@pytest.fixture
+def expected_quantities(plan_settings):
+    lead_time, sku_table, prefix_sums, _ = planning.load_plan_inputs(plan_settings['file'], use_cache=False)
+    schedule = settings.platform_schedule(2, NUM_OF_PLATFORMS, 'yes', ())
+    _, quantities = planning.plan_orders(sku_table, lead_time, schedule, 'yes', prefix_sums=prefix_sums,
+                                         verbose=False)
+    return quantities
+
+
+async def _request(address, method, target, raw=None):
+    """یک درخواست HTTP به سرویس؛ خروجی (کد وضعیت، بدنه JSON)."""
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(raw if raw is not None else f"{method} {target} HTTP/1.1\r\nHost: test\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), json.loads(body)
+
+
+def _serve_and_run(plan_settings, requests, patch=None):
+    """شروع سرویس روی یک پورت آزاد، فرستادن درخواست‌ها و بستن سرویس."""
+    planning_service = service.PlanningService(plan_settings, poll_interval=60)
+    if patch is not None:
+        patch(planning_service)
+
+    async def run():
+        ready = asyncio.Event()
+        server = asyncio.create_task(planning_service.serve('127.0.0.1', 0, ready))
+        await ready.wait()
+        try:
+            return [await _request(planning_service.address, *request) for request in requests]
+        finally:
+            server.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await server
+
+    return asyncio.run(run())
+
+
+def test_status_codes(plan_settings):
+    responses = _serve_and_run(plan_settings, [
+        ('GET', '/health'),
+        ('GET', '/orders'),
+        ('GET', '/orders?platform=9'),
+        ('GET', '/orders?platform=x'),
+        ('GET', '/missing'),
+        ('POST', '/orders?platform=1'),
+        ('GET', '/reload'),
+        (None, None, b'garbage\r\n\r\n'),
+    ])
+    assert [status for status, _ in responses] == [200, 400, 400, 400, 404, 405, 405, 400]
+    health = responses[0][1]
+    assert health['status'] == 'ok' and health['platforms'] == NUM_OF_PLATFORMS and health['last_error'] is None
+
+
+def test_platform_and_sku_queries(plan_settings, expected_quantities):
+    (platform_status, by_platform), (sku_status, by_sku) = _serve_and_run(plan_settings, [
+        ('GET', '/orders?platform=1'),
+        ('GET', '/orders?sku=1000000,999&sku=1000001'),
+    ])
+    assert platform_status == sku_status == 200
+    ordered = np.flatnonzero(expected_quantities[:, 0] > 0)
+    assert [order['product_code'] for order in by_platform['orders']] == [str(1000000 + row) for row in ordered]
+    assert [order['quantity'] for order in by_platform['orders']] == expected_quantities[ordered, 0].tolist()
+    assert by_sku['missing'] == ['999']
+    assert [(order['product_code'], order['platform'], order['quantity']) for order in by_sku['orders']] == [
+        (code, f'P{column + 1}', int(expected_quantities[row, column]))
+        for row, code in ((0, '1000000'), (1, '1000001')) for column in range(NUM_OF_PLATFORMS)]
+
+
+def test_unexpected_error_answers_500_and_keeps_serving(plan_settings):
+    def broken(platform):
+        raise KeyError(platform)
+
+    responses = _serve_and_run(plan_settings, [('GET', '/orders?platform=1'), ('GET', '/health')],
+                               patch=lambda planning_service: setattr(planning_service, 'query_platform', broken))
+    assert responses[0] == (500, {'error': "KeyError: '1'"})
+    assert responses[1][0] == 200
@@ -0,0 +1,126 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inv_control import loader
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """شیت‌هایی که واقعاً از فایل اکسل خوانده شده‌اند (cache miss)."""
+    calls = []
+    read_sheets = loader._read_sheets
+
+    def counting(excel_file_name, sheet_names, read_plans):
+        calls.extend(sheet_names)
+        return read_sheets(excel_file_name, sheet_names, read_plans)
+
+    monkeypatch.setattr(loader, '_read_sheets', counting)
+    return calls
+
+
+def _read(book, tmp_path, **kwargs):
+    return loader.read_workbook_sheets(book, ['1000', 'DB'], cache_dir=str(tmp_path / 'cache'), **kwargs)
+
+
+def test_cache_hit_returns_the_same_frames(book, tmp_path, reads):
+    fresh = loader.read_workbook_sheets(book, ['1000', 'DB'], use_cache=False)
+    reads.clear()
+    _read(book, tmp_path)
+    cached = _read(book, tmp_path)
+    assert reads == ['1000', 'DB']
+    for name, df in fresh.items():
+        pd.testing.assert_frame_equal(cached[name], df, check_exact=True)
+        # کد 1000000 عدد صحیح و '-' متن می‌ماند (نه 1000000.0 یا شیء دیگر)
+        for column in df.columns:
+            assert [type(value) for value in cached[name][column]] == [type(value) for value in df[column]]
+
+
+def test_cache_miss_after_the_workbook_changes(book, tmp_path, reads):
+    _read(book, tmp_path)
+    stat = os.stat(book)
+    os.utime(book, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    _read(book, tmp_path)
+    assert reads == ['1000', 'DB', '1000', 'DB']
+    # نسخه قبلی هر شیت پاک می‌شود
+    assert len(os.listdir(tmp_path / 'cache')) == 2
+
+
+def test_read_plan_is_part_of_the_key(book, tmp_path, reads):
+    db = _read(book, tmp_path)['DB']
+    read_plan = loader.sheet_read_plan(loader.read_db_settings(db)['layout'])
+    loader.read_workbook_sheets(book, ['1000'], cache_dir=str(tmp_path / 'cache'), read_plans={'1000': read_plan})
+    assert reads == ['1000', 'DB', '1000']
+
+
+def test_content_hash_is_opt_in(book, tmp_path, reads):
+    _read(book, tmp_path)
+    # محتوای متفاوت با همان اندازه و زمان تغییر: فقط کلید با هش محتوا متوجه می‌شود
+    stat = os.stat(book)
+    with open(book, 'r+b') as f:
+        f.seek(stat.st_size - 1)
+        last = f.read(1)
+        f.seek(stat.st_size - 1)
+        f.write(bytes([last[0] ^ 1]))
+    os.utime(book, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    _read(book, tmp_path)
+    assert reads == ['1000', 'DB']
+    _read(book, tmp_path, content_hash=True)
+    assert reads == ['1000', 'DB', '1000', 'DB']
+
+
+def test_snapshot_files_hold_no_pickles(book, tmp_path):
+    _read(book, tmp_path)
+    for name in os.listdir(tmp_path / 'cache'):
+        with np.load(tmp_path / 'cache' / name, allow_pickle=False) as data:
+            assert all(data[key].dtype != object for key in data.files)
+
+
+def test_pickled_snapshot_is_ignored(book, tmp_path, reads):
+    _read(book, tmp_path)
+    for name in os.listdir(tmp_path / 'cache'):
+        with open(tmp_path / 'cache' / name, 'wb') as f:
+            np.savez(f, __columns__=np.array([0], dtype=object), c0=np.array([object()], dtype=object))
+    sheets = _read(book, tmp_path)
+    assert reads == ['1000', 'DB', '1000', 'DB']
+    assert sheets['DB'].shape[0] > 0
+
+
+def test_unsupported_cells_are_not_cached(tmp_path):
+    df = pd.DataFrame({0: pd.Series([1, 'a', pd.Timestamp('2026-01-01', tz='UTC')], dtype=object)})
+    with pytest.raises(TypeError):
+        loader._save_frame_snapshot(str(tmp_path / 'x.npz'), df)
+    assert not os.listdir(tmp_path)
+
+
+@pytest.mark.parametrize('content', [b'', b'PK\x03\x04 truncated', b'not a zip file'])
+def test_corrupted_snapshot_is_read_again(book, tmp_path, reads, content):
+    fresh = _read(book, tmp_path)
+    for name in os.listdir(tmp_path / 'cache'):
+        with open(tmp_path / 'cache' / name, 'wb') as f:
+            f.write(content)
+    sheets = _read(book, tmp_path)
+    assert reads == ['1000', 'DB', '1000', 'DB']
+    for name, df in fresh.items():
+        pd.testing.assert_frame_equal(sheets[name], df)
+    # فایل خراب با نسخه سالم جایگزین شده است
+    _read(book, tmp_path)
+    assert reads == ['1000', 'DB', '1000', 'DB']
+
+
+def test_timestamp_cells_are_cached_as_datetimes(tmp_path):
+    cells = [pd.Timestamp('2026-01-02 03:04:05'), np.datetime64('2026-01-03'), datetime(2026, 1, 4), 'x', 1]
+    path = str(tmp_path / 'x.npz')
+    loader._save_frame_snapshot(path, pd.DataFrame({0: pd.Series(cells, dtype=object)}))
+    assert loader._load_frame_snapshot(path)[0].tolist() == [
+        datetime(2026, 1, 2, 3, 4, 5), datetime(2026, 1, 3), datetime(2026, 1, 4), 'x', 1]
+
+
+@pytest.mark.parametrize('cell', [pd.Timestamp('2026-01-01 00:00:00.000000001'),
+                                  np.datetime64('2026-01-01T00:00:00.000000001')])
+def test_nanosecond_dates_are_not_cached(tmp_path, cell):
+    with pytest.raises(TypeError):
+        loader._save_frame_snapshot(str(tmp_path / 'x.npz'), pd.DataFrame({0: pd.Series([cell], dtype=object)}))
@@ -0,0 +1,101 @@
+import os
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from inv_control import planning, settings, writers
+
+
+@pytest.fixture(scope='module')
+def main_order(workbook):
+    lead_time, sku_table, prefix_sums, _ = planning.load_plan_inputs(workbook, use_cache=False)
+    schedule = settings.platform_schedule(2, 3, 'yes', ())
+    main_order, _ = planning.plan_orders(sku_table, lead_time, schedule, 'yes', prefix_sums=prefix_sums,
+                                         verbose=False)
+    return main_order
+
+
+def _expected_rows(main_order):
+    """(پلتفرم، تاریخ، کد محصول، مقدار) همه سفارش‌ها به ترتیب نوشتن."""
+    return [(platform, order_date.isoformat(), str(code), int(qty))
+            for platform in main_order for order_date, code, qty in main_order[platform]]
+
+
+def test_csv_output(tmp_path, main_order):
+    path = str(tmp_path / 'orders.csv')
+    writers.write_suggested_orders(main_order, path)
+    df = pd.read_csv(path, dtype=str)
+    assert tuple(df.columns) == writers.ORDER_COLUMNS
+    rows = [(platform, day, code, int(qty)) for platform, day, code, qty in df.itertuples(index=False)]
+    assert rows == _expected_rows(main_order)
+    assert rows
+
+
+def test_xlsx_single_sheet_keeps_the_legacy_layout(tmp_path, main_order):
+    path = str(tmp_path / 'orders.xlsx')
+    writers.write_suggested_orders(main_order, path)
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Sheet1']
+    rows = [[cell for cell in row if cell is not None] for row in workbook['Sheet1'].iter_rows(values_only=True)]
+    workbook.close()
+    expected = []
+    for platform in main_order:
+        expected.append([platform])
+        expected.append(writers.ORDER_HEADER)
+        expected.extend([datetime.combine(order_date, time()), str(code), qty]
+                        for order_date, code, qty in main_order[platform])
+        expected.append([])
+    # openpyxl کد محصول عددی را int می‌خواند
+    assert [[str(cell) if i == 1 else cell for i, cell in enumerate(row)] for row in rows] == expected
+
+
+def test_xlsx_per_platform_writes_one_sheet_each(tmp_path, main_order):
+    path = str(tmp_path / 'orders.xlsx')
+    writers.write_suggested_orders(main_order, path, layout='per_platform')
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == list(main_order)
+    for platform, df in sheets.items():
+        assert list(df.columns) == writers.ORDER_HEADER
+        assert df[writers.ORDER_HEADER[2]].tolist() == [qty for _, _, qty in main_order[platform]]
+
+
+def test_per_platform_layout_needs_xlsx(tmp_path):
+    with pytest.raises(ValueError, match="per_platform"):
+        writers.open_order_writer(str(tmp_path / 'orders.csv'), layout='per_platform')
+
+
+def test_parquet_output(tmp_path, main_order):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'orders.parquet')
+    writers.write_suggested_orders(main_order, path)
+    df = pd.read_parquet(path)
+    assert tuple(df.columns) == writers.ORDER_COLUMNS
+    rows = [(platform, day.isoformat(), code, int(qty)) for platform, day, code, qty in df.itertuples(index=False)]
+    assert rows == _expected_rows(main_order)
+
+
+@pytest.mark.parametrize('extension', ['.xlsx', '.csv'])
+def test_failed_run_keeps_the_previous_output(tmp_path, main_order, extension):
+    path = str(tmp_path / f'orders{extension}')
+    writers.write_suggested_orders(main_order, path)
+    with open(path, 'rb') as f:
+        previous = f.read()
+    with pytest.raises(RuntimeError):
+        with writers.open_order_writer(path) as writer:
+            writer.write_columns('P1', *main_order.platform_columns('P1'))
+            raise RuntimeError("calculation failed")
+    with open(path, 'rb') as f:
+        assert f.read() == previous
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_background_writer_matches_the_direct_writer(tmp_path, main_order):
+    direct, background = str(tmp_path / 'direct.csv'), str(tmp_path / 'background.csv')
+    writers.write_suggested_orders(main_order, direct)
+    with writers.BackgroundOrderWriter(writers.open_order_writer(background), max_pending=1) as writer:
+        for platform in main_order:
+            writer.write_columns(platform, *main_order.platform_columns(platform))
+    with open(direct, 'rb') as a, open(background, 'rb') as b:
+        assert a.read() == b.read()